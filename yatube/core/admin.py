@@ -0,0 +1,66 @@
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import ProfileCapture, SlowQuery
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ProfileCaptureAdmin(ReadOnlyAdmin):
+    list_display = (
+        'created', 'method', 'path', 'view', 'status', 'duration',
+        'queries', 'user',
+    )
+    list_filter = ('view', 'status')
+    search_fields = ('path',)
+    exclude = ('stats',)
+    readonly_fields = ('download',)
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_profilecapture_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        capture = get_object_or_404(ProfileCapture, pk=pk)
+        if not self.has_view_permission(request, capture):
+            return HttpResponse(status=403)
+        response = HttpResponse(
+            bytes(capture.stats), content_type='application/octet-stream'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="profile-{capture.pk}.prof"'
+        )
+        return response
+
+    def download(self, obj):
+        url = reverse('admin:core_profilecapture_download', args=[obj.pk])
+        return format_html('<a href="{}">profile-{}.prof</a>', url, obj.pk)
+    download.short_description = 'Дамп pstats'
+
+
+class SlowQueryAdmin(ReadOnlyAdmin):
+    list_display = ('created', 'view', 'duration', 'short_sql')
+    list_filter = ('view',)
+    search_fields = ('sql', 'path')
+
+    def short_sql(self, obj):
+        return obj.sql[:120]
+    short_sql.short_description = 'SQL'
+
+
+admin.site.register(ProfileCapture, ProfileCaptureAdmin)
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import \
+    AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+USER_CACHE_TIMEOUT = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60 * 5)
+
+
+def user_cache_key(user_id):
+    return f'core:user:{user_id}'
+
+
+def get_user(request):
+    """Как django.contrib.auth.get_user, но пользователь берётся из кеша."""
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        cache.set(key, user, USER_CACHE_TIMEOUT)
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    ):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+class AuthenticationMiddleware(BaseAuthenticationMiddleware):
+    """request.user из общего кеша, без запроса к базе.
+
+    Кеш сбрасывается при любом сохранении пользователя, в том числе
+    при смене пароля и обновлении last_login.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: self.get_user(request))
+
+    def get_user(self, request):
+        if not hasattr(request, '_cached_user'):
+            request._cached_user = get_user(request)
+        return request._cached_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
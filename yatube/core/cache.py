@@ -0,0 +1,262 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    """
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )
+    """,
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_ai AFTER INSERT ON cache BEGIN
+        UPDATE cache_stats SET entries = entries + 1,
+            size = size + length(new.value);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_ad AFTER DELETE ON cache BEGIN
+        UPDATE cache_stats SET entries = entries - 1,
+            size = size - length(old.value);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_au AFTER UPDATE OF value ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET size = size - length(old.value) + length(new.value);
+    END
+    """,
+)
+
+ALIVE = '(expires IS NULL OR expires > ?)'
+# Обращение к записи обновляется не чаще раза в секунду:
+# чтение почти никогда не превращается в запись.
+ACCESS_RESOLUTION = 1
+# UPDATE ... RETURNING появился в SQLite 3.35; в старых версиях
+# incr() делает UPDATE и SELECT в одной транзакции.
+RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite в режиме WAL, общий для всех процессов.
+
+    LOCATION — путь к файлу. Кроме MAX_ENTRIES и CULL_FREQUENCY
+    понимает OPTIONS['MAX_SIZE'] — предел суммарного размера значений
+    в байтах. При переполнении вытесняются давно не читанные записи.
+    Целые числа хранятся как INTEGER, поэтому incr() — один UPDATE.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.max_size = options.get('MAX_SIZE')
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _touch_read(self, keys, now):
+        self.connection.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            [(now, key, now - ACCESS_RESOLUTION) for key in keys],
+        )
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        names = {self._key(key, version): key for key in keys}
+        now = time.time()
+        placeholders = ', '.join('?' * len(names))
+        rows = self.connection.execute(
+            f'SELECT key, value FROM cache '
+            f'WHERE key IN ({placeholders}) AND {ALIVE}',
+            [*names, now],
+        ).fetchall()
+        if rows:
+            self._touch_read([name for name, _ in rows], now)
+        found = {names[name]: self._load(value) for name, value in rows}
+        metrics.cache_lookups(keys, found)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version), self._dump(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self.connection as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO cache VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires, accessed = excluded.accessed',
+                rows,
+            )
+            self._cull(conn, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self.connection as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute(
+                'INSERT INTO cache VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires, accessed = excluded.accessed '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (self._key(key, version), self._dump(value),
+                 self.get_backend_timeout(timeout), now, now),
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._cull(conn, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        update = (
+            f'UPDATE cache SET value = value + ? '
+            f"WHERE key = ? AND typeof(value) = 'integer' AND {ALIVE}"
+        )
+        params = (delta, name, time.time())
+        if RETURNING:
+            row = self.connection.execute(
+                f'{update} RETURNING value', params
+            ).fetchone()
+        else:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = None
+                if self.connection.execute(update, params).rowcount:
+                    row = self.connection.execute(
+                        'SELECT value FROM cache WHERE key = ?', (name,)
+                    ).fetchone()
+            finally:
+                self.connection.execute('COMMIT')
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.connection.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self.connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        with self.connection as conn:
+            conn.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys],
+            )
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def _cull(self, conn, now):
+        """Вытесняет просроченные, затем давно не читанные записи."""
+        entries, size = conn.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        over_size = self.max_size is not None and size > self.max_size
+        if entries <= self._max_entries and not over_size:
+            return
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache')
+            return
+        conn.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        entries, size = conn.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        while entries > self._max_entries or (
+            self.max_size is not None and size > self.max_size
+        ):
+            count = max(1, entries // self._cull_frequency)
+            conn.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (count,),
+            )
+            entries, size = conn.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone()
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока, как у LocMemCache память.
+        pass
@@ -0,0 +1,45 @@
+from django.db.backends.sqlite3 import base
+
+# Значения по умолчанию; OPTIONS['pragmas'] в DATABASES их дополняет.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'auto_vacuum': 'INCREMENTAL',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite для нескольких процессов сервера.
+
+    Каждое новое соединение получает PRAGMAS: журнал WAL, чтобы чтение
+    не ждало записи, и busy_timeout, чтобы запись ждала, а не падала
+    с «database is locked». Транзакции начинаются с BEGIN IMMEDIATE:
+    блокировка записи берётся сразу, и две транзакции не упираются
+    друг в друга при переходе от чтения к записи, где SQLite не ждёт
+    busy_timeout. Соединения живут CONN_MAX_AGE секунд.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def check_constraints(self, table_names=None):
+        # Шард без проверки внешних ключей ссылается на строки из default.
+        pragmas = getattr(self, 'pragmas', PRAGMAS)
+        if str(pragmas.get('foreign_keys', 'ON')).upper() in ('OFF', '0'):
+            return
+        super().check_constraints(table_names)
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
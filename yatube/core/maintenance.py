@@ -0,0 +1,82 @@
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+USING_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+
+def _pragma(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()
+
+
+def checkpoint(mode='TRUNCATE'):
+    """Переносит WAL в базу: (занято, страниц в журнале, перенесено)."""
+    return _pragma(f'wal_checkpoint({mode})')
+
+
+def analyze():
+    """Обновляет статистику планировщика."""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+
+
+def incremental_vacuum(pages=0):
+    """Возвращает свободные страницы файлу; 0 — все.
+
+    Возвращает число освобождённых страниц или None, если база создана
+    без auto_vacuum = INCREMENTAL и сначала нужен полный VACUUM.
+    """
+    if _pragma('auto_vacuum')[0] != 2:
+        return None
+    before = _pragma('freelist_count')[0]
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+        cursor.fetchall()
+    return before - _pragma('freelist_count')[0]
+
+
+def enable_incremental_vacuum():
+    """Переводит существующую базу на auto_vacuum = INCREMENTAL."""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+def indexes():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY tbl_name, name"
+        )
+        return cursor.fetchall()
+
+
+def captured_statements(urls):
+    """SQL, который выполняют страницы, с подставленными параметрами."""
+    client = Client(HTTP_HOST='localhost')
+    with CaptureQueriesContext(connection) as captured:
+        for url in urls:
+            client.get(url)
+    return [query['sql'] for query in captured.captured_queries]
+
+
+def index_usage(statements):
+    """Сколько запросов из statements использует каждый индекс."""
+    used = Counter()
+    with connection.cursor() as cursor:
+        for sql in statements:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            names = {
+                name for row in cursor.fetchall()
+                for name in USING_INDEX.findall(row[-1])
+            }
+            used.update(names)
+    return {name: used[name] for name, _ in indexes()}
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+PARAMS = {'OPTIONS': {'MAX_ENTRIES': 100_000}}
+VALUE = {'html': 'x' * 2000, 'count': 42}
+
+
+def make_backend(name, directory):
+    if name == 'locmem':
+        return LocMemCache('bench', PARAMS)
+    if name == 'file':
+        return FileBasedCache(os.path.join(directory, 'file'), PARAMS)
+    return SQLiteCache(os.path.join(directory, 'cache.sqlite3'), PARAMS)
+
+
+def timed(operation, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        operation(i)
+    return ops / (time.perf_counter() - start)
+
+
+def worker(name, directory, keys, ops, results):
+    """Читает общие ключи, пересчитывая промахи, как ленты в воркерах."""
+    cache = make_backend(name, directory)
+    hits = 0
+    for i in range(ops):
+        key = f'shared:{i % keys}'
+        if cache.get(key) is None:
+            cache.set(key, VALUE)
+        else:
+            hits += 1
+    results.put(hits)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает LocMemCache, FileBasedCache и SQLiteCache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--keys', type=int, default=200)
+
+    def handle(self, *args, ops, workers, keys, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            self.stdout.write(
+                f'{"backend":<8} {"set/s":>9} {"get/s":>9} '
+                f'{"get_many/s":>11} {"incr/s":>9} {"hit rate":>9}'
+            )
+            for name in ('locmem', 'file', 'sqlite'):
+                self.stdout.write(
+                    self.run(name, directory, ops, workers, keys)
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, name, directory, ops, workers, keys):
+        cache = make_backend(name, directory)
+        cache.clear()
+        batch = [f'k:{i}' for i in range(10)]
+        sets = timed(lambda i: cache.set(f'k:{i % keys}', VALUE), ops)
+        gets = timed(lambda i: cache.get(f'k:{i % keys}'), ops)
+        many = timed(lambda i: cache.get_many(batch), ops)
+        cache.set('counter', 0)
+        incrs = timed(lambda i: cache.incr('counter'), ops)
+
+        cache.clear()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=worker, args=(name, directory, keys, ops, results)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        hits = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        hit_rate = hits / (ops * workers)
+        return (
+            f'{name:<8} {sets:>9.0f} {gets:>9.0f} '
+            f'{many:>11.0f} {incrs:>9.0f} {hit_rate:>9.1%}'
+        )
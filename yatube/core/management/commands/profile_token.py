@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = 'Печатает заголовок, включающий профиль запроса.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'X-Profile: {profiling.make_token()}')
+        self.stderr.write(
+            f'Действует {profiling.TOKEN_MAX_AGE} с.'
+        )
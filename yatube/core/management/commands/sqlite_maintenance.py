@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import maintenance
+from posts.benchmark import targets
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание базы SQLite: checkpoint WAL, ANALYZE, '
+        'инкрементальный VACUUM и отчёт об использовании индексов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=float, metavar='SECONDS',
+            help='Повторять обслуживание с этим интервалом.',
+        )
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=0,
+            help='Сколько свободных страниц вернуть за раз; 0 — все.',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Перевести базу на auto_vacuum = INCREMENTAL (полный '
+                 'VACUUM, блокирует запись).',
+        )
+        parser.add_argument(
+            '--index-usage', action='store_true',
+            help='Открыть страницы posts и показать, какие индексы '
+                 'используют их запросы.',
+        )
+
+    def handle(self, *args, every, vacuum_pages, enable_incremental_vacuum,
+               index_usage, **options):
+        if enable_incremental_vacuum:
+            maintenance.enable_incremental_vacuum()
+            self.stdout.write('auto_vacuum = INCREMENTAL')
+        if index_usage:
+            self.report_index_usage()
+        while True:
+            self.maintain(vacuum_pages)
+            if not every:
+                break
+            time.sleep(every)
+
+    def maintain(self, vacuum_pages):
+        busy, log, moved = maintenance.checkpoint()
+        self.stdout.write(
+            f'checkpoint: страниц в WAL {log}, перенесено {moved}'
+            + (', база занята' if busy else '')
+        )
+        maintenance.analyze()
+        self.stdout.write('ANALYZE: статистика обновлена')
+        freed = maintenance.incremental_vacuum(vacuum_pages)
+        if freed is None:
+            self.stdout.write(
+                'incremental_vacuum: выключен, запустите с '
+                '--enable-incremental-vacuum'
+            )
+        else:
+            self.stdout.write(f'incremental_vacuum: освобождено {freed}')
+
+    def report_index_usage(self):
+        statements = maintenance.captured_statements(
+            targets(prefix='').values()
+        )
+        usage = maintenance.index_usage(statements)
+        self.stdout.write(f'Запросов разобрано: {len(statements)}')
+        for name, count in sorted(usage.items(), key=lambda item: -item[1]):
+            self.stdout.write(f'{count:>6}  {name}')
+        unused = [name for name, count in usage.items() if not count]
+        if unused:
+            self.stdout.write(
+                'Не используются этими страницами: ' + ', '.join(unused)
+            )
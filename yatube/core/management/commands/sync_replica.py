@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import routers
+
+
+def sync(alias, source='default'):
+    """Копирует основную базу в файл реплики через backup API SQLite.
+
+    Заменяет настоящую репликацию при локальной разработке и тестах:
+    читатели реплики видят либо прежнюю копию, либо новую целиком.
+    """
+    started = time.time()
+    connection = connections[source]
+    connection.ensure_connection()
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+    routers.record_sync(alias, started)
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу в реплики из DATABASE_REPLICAS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Алиасы реплик; по умолчанию DATABASE_REPLICAS.',
+        )
+        parser.add_argument(
+            '--every', type=float, metavar='SECONDS',
+            help='Повторять копирование с этим интервалом.',
+        )
+
+    def handle(self, *args, aliases, every, **options):
+        aliases = aliases or settings.DATABASE_REPLICAS
+        while True:
+            for alias in aliases:
+                started = time.perf_counter()
+                sync(alias)
+                self.stdout.write(
+                    f'{alias}: {time.perf_counter() - started:.3f} с'
+                )
+            if not every:
+                break
+            time.sleep(every)
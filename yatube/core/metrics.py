@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+# Имя семейства: (тип, описание, границы корзин для гистограмм).
+FAMILIES = {
+    'yatube_requests_total': (
+        'counter', 'Ответы по адресу и коду.', None,
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'yatube_response_size_bytes': (
+        'histogram', 'Размер тела ответа.',
+        (1024, 4096, 16384, 65536, 262144, 1048576),
+    ),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы по адресу.', None,
+    ),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время SQL-запросов по адресу.', None,
+    ),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время рендера шаблона верхнего уровня.',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кешу по виду ключа: hit или miss.', None,
+    ),
+}
+# Накопленное в процессе сбрасывается в общую базу не чаще раза в секунду.
+FLUSH_INTERVAL = 1
+
+_buffer = defaultdict(float)
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_local = threading.local()
+
+
+def _connection():
+    path = settings.METRICS_DATABASE
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.key != (path, os.getpid()):
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS samples ('
+            'name TEXT, labels TEXT, value REAL NOT NULL, '
+            'PRIMARY KEY (name, labels)) WITHOUT ROWID'
+        )
+        _local.conn, _local.key = conn, (path, os.getpid())
+    return conn
+
+
+def _labels(labels):
+    return ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for key, value in sorted(labels.items())
+    )
+
+
+def inc(name, labels, value=1):
+    with _lock:
+        _buffer[name, _labels(labels)] += value
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def observe(name, labels, value):
+    """Добавляет наблюдение в гистограмму: корзины, сумму и количество."""
+    buckets = FAMILIES[name][2]
+    position = bisect_left(buckets, value)
+    for bound in buckets[position:]:
+        inc(f'{name}_bucket', {**labels, 'le': bound})
+    inc(f'{name}_bucket', {**labels, 'le': '+Inf'})
+    inc(f'{name}_sum', labels, value)
+    inc(f'{name}_count', labels)
+
+
+def flush():
+    """Прибавляет накопленное процессом к общей базе одной транзакцией."""
+    global _last_flush
+    with _lock:
+        rows = [(name, labels, value) for (name, labels), value
+                in _buffer.items()]
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not rows:
+        return
+    with _connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany(
+            'INSERT INTO samples VALUES (?, ?, ?) '
+            'ON CONFLICT (name, labels) '
+            'DO UPDATE SET value = value + excluded.value',
+            rows,
+        )
+
+
+def _family(sample):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if sample.endswith(suffix) and sample[:-len(suffix)] in FAMILIES:
+            return sample[:-len(suffix)]
+    return sample
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def exposition():
+    """Все метрики всех процессов в текстовом формате Prometheus."""
+    flush()
+    rows = _connection().execute(
+        'SELECT name, labels, value FROM samples ORDER BY name, labels'
+    ).fetchall()
+    grouped = defaultdict(list)
+    for name, labels, value in rows:
+        grouped[_family(name)].append((name, labels, value))
+    lines = []
+    for family in sorted(grouped):
+        kind, description, _ = FAMILIES.get(family, ('untyped', '', None))
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in grouped[family]:
+            labels = '{%s}' % labels if labels else ''
+            lines.append(f'{name}{labels} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _buffer.clear()
+    _connection().execute('DELETE FROM samples')
+
+
+def _cache_kind(key):
+    # template.cache.<фрагмент>.<хеш> у {% cache %}, posts:<вид>:… у остальных.
+    if key.startswith('template.cache.'):
+        return 'fragment:' + key.split('.')[2]
+    return ':'.join(key.split(':')[:2])
+
+
+def cache_lookups(keys, found):
+    """Считает попадания и промахи кеша по виду ключа."""
+    totals = defaultdict(lambda: [0, 0])
+    for key in keys:
+        totals[_cache_kind(key)][key not in found] += 1
+    for kind, (hits, misses) in totals.items():
+        if hits:
+            inc('yatube_cache_requests_total',
+                {'cache': kind, 'result': 'hit'}, hits)
+        if misses:
+            inc('yatube_cache_requests_total',
+                {'cache': kind, 'result': 'miss'}, misses)
@@ -0,0 +1,116 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import metrics, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+READ_VIEWS = {
+    'posts:posts', 'posts:groups', 'posts:profile', 'posts:post_detail',
+    'posts:comments', 'posts:follow_index',
+}
+PIN_COOKIE = 'primary_pin'
+PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+class MetricsMiddleware:
+    """Время ответа, SQL и размер ответа по имени адреса.
+
+    Стоит первым, поэтому учитывает и ответы из кеша страниц.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0, 0.0]
+
+        def count(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        view = {'view': self.view_name(request)}
+        metrics.inc('yatube_requests_total', {
+            **view, 'method': request.method,
+            'status': response.status_code,
+        })
+        metrics.observe('yatube_request_duration_seconds', view, elapsed)
+        metrics.inc('yatube_db_queries_total', view, queries[0])
+        metrics.inc('yatube_db_query_seconds_total', view, queries[1])
+        if not response.streaming:
+            metrics.observe(
+                'yatube_response_size_bytes', view, len(response.content)
+            )
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return 'unmatched'
+        return match.view_name
+
+
+class ReplicaMiddleware:
+    """Чтение с реплики для страниц из READ_VIEWS.
+
+    Реплика используется, если отстаёт от последней записи через сайт
+    не больше чем на REPLICA_MAX_LAG секунд. После записи пользователь
+    на REPLICA_PIN_SECONDS получает cookie: его запросы читают только
+    с реплик, скопированных после последней записи, иначе с основной
+    базы, поэтому он видит свой пост или комментарий. Записью считаются
+    небезопасные методы и GET, который на деле записал в основную базу
+    (подписка по ссылке); открытая форма записью не считается. Ответ,
+    прочитанный с отстающей реплики, помечается атрибутом
+    replica_lagging.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view = self.view_name(request)
+        routers.begin_request()
+        replicas = []
+        lagging = False
+        if view in READ_VIEWS:
+            max_lag = 0 if PIN_COOKIE in request.COOKIES else routers.MAX_LAG
+            lags = routers.replica_lags()
+            replicas = [
+                alias for alias, lag in lags.items() if lag <= max_lag
+            ]
+            lagging = any(lags[alias] for alias in replicas)
+        if replicas:
+            with routers.reading_from_replica(replicas, lagging):
+                response = self.get_response(request)
+            response.replica_lagging = lagging
+        else:
+            response = self.get_response(request)
+        if request.method not in SAFE_METHODS or routers.request_written():
+            routers.record_write()
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=PIN_SECONDS, httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def view_name(self, request):
+        try:
+            return resolve(request.path_info).view_name
+        except Resolver404:
+            return None
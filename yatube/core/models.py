@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import models
+
+
+class ProfileCapture(models.Model):
+    """Профиль cProfile одного запроса."""
+
+    created = models.DateTimeField('Снят', auto_now_add=True, db_index=True)
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Адрес', max_length=2000)
+    view = models.CharField('Обработчик', max_length=200)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, verbose_name='Пользователь',
+    )
+    status = models.PositiveSmallIntegerField('Код ответа')
+    duration = models.FloatField('Время, с')
+    queries = models.PositiveIntegerField('SQL-запросов')
+    stats = models.BinaryField('Дамп pstats')
+    summary = models.TextField('Самые затратные функции')
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration:.3f} с)'
+
+
+class SlowQuery(models.Model):
+    """SQL-запрос дольше порога вместе с планом выполнения."""
+
+    created = models.DateTimeField('Записан', auto_now_add=True, db_index=True)
+    path = models.CharField('Адрес', max_length=2000)
+    view = models.CharField('Обработчик', max_length=200)
+    sql = models.TextField('SQL')
+    params = models.TextField('Параметры', blank=True)
+    duration = models.FloatField('Время, с')
+    plan = models.TextField('EXPLAIN QUERY PLAN', blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'медленный запрос'
+        verbose_name_plural = 'медленные запросы'
+
+    def __str__(self):
+        return f'{self.sql[:80]} ({self.duration:.3f} с)'
@@ -0,0 +1,159 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import DatabaseError, connections
+
+from .models import ProfileCapture, SlowQuery
+
+# Заголовок X-Profile с подписанным токеном включает профиль для любого
+# запроса, параметр ?_profile — для сотрудников.
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAM = '_profile'
+SALT = 'core.profiling'
+TOKEN_MAX_AGE = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 60 * 60)
+SLOW_QUERY_THRESHOLD = getattr(
+    settings, 'PROFILING_SLOW_QUERY_THRESHOLD', 0.1
+)
+SUMMARY_LINES = 40
+
+_local = threading.local()
+
+
+def make_token():
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def token_is_valid(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def requested(request):
+    token = request.META.get(HEADER)
+    if token is not None:
+        return token_is_valid(token)
+    user = getattr(request, 'user', None)
+    return QUERY_PARAM in request.GET and user is not None and user.is_staff
+
+
+def explain(connection, sql, params):
+    """План запроса деревом, как его печатает sqlite3 .eqp."""
+    if connection.vendor != 'sqlite':
+        return ''
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError as error:
+        return f'Не удалось получить план: {error}'
+    finally:
+        _local.explaining = False
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else ''
+
+
+class ProfilingMiddleware:
+    """Профиль запроса по требованию и журнал медленных SQL-запросов.
+
+    Стоит последним, после аутентификации. Профиль cProfile сохраняется
+    в ProfileCapture в формате pstats, его id приходит в заголовке
+    X-Profile-Id. Запросы дольше SLOW_QUERY_THRESHOLD секунд пишутся
+    в SlowQuery вместе с EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow = []
+        queries = [0]
+
+        def capture(execute, sql, params, many, context):
+            if getattr(_local, 'explaining', False):
+                return execute(sql, params, many, context)
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                elapsed = time.perf_counter() - started
+                if elapsed >= SLOW_QUERY_THRESHOLD:
+                    slow.append((
+                        context['connection'], sql,
+                        None if many else params, elapsed,
+                    ))
+
+        profiler = cProfile.Profile() if requested(request) else None
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(capture))
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        elapsed = time.perf_counter() - started
+        if slow:
+            self.save_slow_queries(request, slow)
+        if profiler is not None:
+            saved = self.save_profile(
+                request, response, profiler, elapsed, queries[0]
+            )
+            response['X-Profile-Id'] = saved.pk
+        return response
+
+    def save_slow_queries(self, request, slow):
+        SlowQuery.objects.bulk_create(
+            SlowQuery(
+                path=request.get_full_path()[:2000],
+                view=_view_name(request),
+                sql=sql,
+                params='' if params is None else repr(params),
+                duration=elapsed,
+                plan=explain(connection, sql, params)
+                if params is not None else '',
+            )
+            for connection, sql, params, elapsed in slow
+        )
+
+    def save_profile(self, request, response, profiler, elapsed, queries):
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        user = getattr(request, 'user', None)
+        return ProfileCapture.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            view=_view_name(request),
+            user=user if user is not None and user.is_authenticated
+            else None,
+            status=response.status_code,
+            duration=elapsed,
+            queries=queries,
+            # Тот же формат, что у pstats.dump_stats: файл открывают
+            # snakeviz, flameprof и gprof2dot.
+            stats=marshal.dumps(stats.stats),
+            summary=summary.getvalue(),
+        )
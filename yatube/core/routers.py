@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Сессии всегда читаются с основной базы: сразу после входа на реплике
+# может не оказаться только что созданной сессии.
+PRIMARY_ONLY_APPS = {'sessions'}
+WRITTEN_KEY = 'core:primary-written'
+# Насколько реплика может отставать от последней записи, чтобы гости и
+# пользователи без недавних записей читали с неё.
+MAX_LAG = getattr(settings, 'REPLICA_MAX_LAG', 5)
+
+_state = threading.local()
+
+
+def _synced_key(alias):
+    return f'core:replica-synced:{alias}'
+
+
+def record_write():
+    cache.set(WRITTEN_KEY, time.time(), None)
+
+
+def record_sync(alias, started):
+    """Отмечает, что реплика содержит все записи до started."""
+    cache.set(_synced_key(alias), started, None)
+
+
+def replica_lags():
+    """Отставание каждой реплики от последней записи через сайт, в секундах.
+
+    Реплика, скопированная после записи, не отстаёт (0); без отметки о
+    копировании отставание бесконечно.
+    """
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas:
+        return {}
+    marks = cache.get_many([WRITTEN_KEY, *map(_synced_key, replicas)])
+    written = marks.get(WRITTEN_KEY, 0)
+    now = time.time()
+    lags = {}
+    for alias in replicas:
+        synced = marks.get(_synced_key(alias))
+        if synced is None:
+            lags[alias] = float('inf')
+        else:
+            lags[alias] = 0 if synced >= written else now - synced
+    return lags
+
+
+def fresh_replicas(max_lag=MAX_LAG):
+    """Реплики, отстающие не больше чем на max_lag секунд.
+
+    max_lag=0 — только реплики, скопированные после последней записи.
+    """
+    return [
+        alias for alias, lag in replica_lags().items() if lag <= max_lag
+    ]
+
+
+def cache_timeout(timeout):
+    """Срок кеша для прочитанного в этом запросе.
+
+    Страница с отстающей реплики попала бы в кеш под уже новым
+    поколением ленты, поэтому живёт там не дольше MAX_LAG.
+    """
+    if getattr(_state, 'lagging', False):
+        return min(timeout, MAX_LAG)
+    return timeout
+
+
+def begin_request():
+    _state.request_written = False
+
+
+def request_written():
+    """Была ли с begin_request() запись в основную базу."""
+    return getattr(_state, 'request_written', False)
+
+
+@contextmanager
+def reading_from_replica(replicas, lagging=False):
+    """Чтение внутри блока идёт на replicas, пока не случилась запись.
+
+    lagging — реплики могут не содержать последних записей.
+    """
+    _state.replicas, _state.written = replicas, False
+    _state.lagging = lagging
+    try:
+        yield
+    finally:
+        _state.replicas, _state.written = None, False
+        _state.lagging = False
+
+
+class ReplicaRouter:
+    """Отправляет чтение на реплики внутри reading_from_replica().
+
+    Блок открывает ReplicaMiddleware. Вне запросов (команды, shell)
+    и после первой записи в запросе всё идёт на основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(_state, 'replicas', None)
+        if not replicas or _state.written:
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.written = _state.request_written = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы, объекты с разных копий связаны.
+        return True
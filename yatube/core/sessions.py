@@ -0,0 +1,161 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections, router, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+# Отметка в кеше вместо сессии: сессия удалена или её нет в базе.
+MISSING = 'missing'
+# Ключи сессии, смена которых означает вход или выход.
+AUTH_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+_pending = {}
+_lock = threading.Lock()
+
+
+class SessionStore(cached_db.SessionStore):
+    """Сессии в общем кеше, в базу — с отложенной записью.
+
+    Чтение берёт сессию из кеша и идёт в базу только на промахе.
+    Новая сессия и смена пользователя (вход, выход, смена пароля)
+    записываются в базу сразу. Прочие изменения пишутся в кеш, а в
+    базу — пачкой после отправки ответа. Удалённые и ненайденные
+    сессии помечаются в кеше: гость с устаревшей cookie не обращается к
+    базе на каждой странице, а отложенная запись не воскрешает сессию
+    после выхода.
+    """
+
+    cache_key_prefix = 'core:session:'
+
+    _persisted_auth = None
+
+    def load(self):
+        data = self._cache.get(self.cache_key)
+        if data == MISSING:
+            self._session_key = None
+            return {}
+        if data is not None:
+            self._persisted_auth = _auth(data)
+            return data
+        key = self.session_key
+        session = self._get_session_from_db()
+        if session is None:
+            self._cache.set(
+                self.cache_key_prefix + key, MISSING,
+                settings.SESSION_COOKIE_AGE,
+            )
+            return {}
+        data = self.decode(session.session_data)
+        self._persisted_auth = _auth(data)
+        self._cache.set(
+            self.cache_key, data,
+            self.get_expiry_age(expiry=session.expire_date),
+        )
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if must_create and self.exists(self.session_key):
+            raise CreateError
+        data = self._get_session(no_load=must_create)
+        self._cache.set(self.cache_key, data, self.get_expiry_age())
+        row = (self.encode(data), self.get_expiry_date())
+        if must_create or _auth(data) != self._persisted_auth:
+            with _lock:
+                _pending.pop(self.session_key, None)
+            _write([(self.session_key, *row)])
+            self._persisted_auth = _auth(data)
+            return
+        with _lock:
+            _pending[self.session_key] = row
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        with _lock:
+            _pending.pop(session_key, None)
+        self._cache.set(
+            self.cache_key_prefix + session_key, MISSING,
+            settings.SESSION_COOKIE_AGE,
+        )
+        self.get_model_class().objects.filter(
+            session_key=session_key
+        ).delete()
+
+
+def _auth(data):
+    return tuple(data.get(key) for key in AUTH_KEYS)
+
+
+def flush_pending():
+    """Записывает отложенные сессии в базу одной транзакцией.
+
+    Сессии, удалённые с тех пор в другом процессе, пропускаются. Если
+    запись не удалась, сессии возвращаются в очередь до следующей попытки.
+    """
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+    prefix = SessionStore.cache_key_prefix
+    try:
+        marks = caches[settings.SESSION_CACHE_ALIAS].get_many(
+            [prefix + key for key in pending]
+        )
+        now = timezone.now()
+        return _write([
+            (key, data, expire_date)
+            for key, (data, expire_date) in pending.items()
+            if marks.get(prefix + key) != MISSING and expire_date > now
+        ])
+    except Exception:
+        with _lock:
+            for key, row in pending.items():
+                # Более свежая версия из этого процесса важнее.
+                _pending.setdefault(key, row)
+        raise
+
+
+def _write(rows):
+    if not rows:
+        return 0
+    using = router.db_for_write(Session)
+    connection = connections[using]
+    adapt = connection.ops.adapt_datetimefield_value
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {Session._meta.db_table} '
+            f'(session_key, session_data, expire_date) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (session_key) DO UPDATE SET '
+            f'session_data = excluded.session_data, '
+            f'expire_date = excluded.expire_date',
+            [(key, data, adapt(expire_date))
+             for key, data, expire_date in rows],
+        )
+    return len(rows)
+
+
+@receiver(request_finished)
+def _flush_after_response(sender, **kwargs):
+    # request_finished приходит после отправки ответа клиенту.
+    try:
+        flush_pending()
+    except DatabaseError:
+        # База занята: сессии остались в очереди до следующего запроса.
+        pass
+
+
+atexit.register(flush_pending)
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+_local = threading.local()
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        # Вложенные render_to_string входят во время внешнего шаблона.
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _local.depth = depth
+            if not depth:
+                metrics.observe(
+                    'yatube_template_render_seconds',
+                    {'template': self.origin.template_name or '<string>'},
+                    time.perf_counter() - started,
+                )
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """DjangoTemplates, который замеряет время рендера шаблонов."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            self.engine.from_string(template_code), self
+        )
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TemporaryFilesRunner(DiscoverRunner):
+    """Кеш и метрики тестов — во временном каталоге.
+
+    cache.clear() в тестах не трогает кеш сервера разработки, а тесты не
+    видят того, что осталось от прошлых запусков.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp(prefix='yatube-test-')
+        caches = {
+            alias: {**options, 'LOCATION': os.path.join(
+                self.directory, f'{alias}.sqlite3'
+            )}
+            for alias, options in settings.CACHES.items()
+        }
+        self.override = override_settings(
+            CACHES=caches,
+            METRICS_DATABASE=os.path.join(self.directory, 'metrics.sqlite3'),
+        )
+        self.override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from .. import cache as cache_module
+from ..cache import SQLiteCache
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        self.cache.set('a', {'x': 1})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.assertFalse(self.cache.add('a', 2))
+        self.assertTrue(self.cache.add('b', 2))
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': {'x': 1}, 'b': 2}
+        )
+        self.cache.set_many({'c': True, 'd': None})
+        self.assertIs(self.cache.get('c'), True)
+        self.assertEqual(self.cache.get('d', 'default'), None)
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_expired_entries_are_invisible(self):
+        self.cache.set('a', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertEqual(self.cache.get('a'), 2)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.assertIncrIsAtomic()
+
+    def test_incr_without_returning(self):
+        """SQLite до 3.35: UPDATE и SELECT в одной транзакции."""
+        with mock.patch.object(cache_module, 'RETURNING', False):
+            self.assertIncrIsAtomic()
+
+    def test_tests_use_temporary_files(self):
+        for path in (
+            settings.CACHES['default']['LOCATION'],
+            settings.METRICS_DATABASE,
+        ):
+            with self.subTest(path=path):
+                self.assertNotEqual(
+                    os.path.dirname(path), str(settings.BASE_DIR)
+                )
+
+    def assertIncrIsAtomic(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_read_entries_are_evicted(self):
+        self.cache.set('hot', 1)
+        for i in range(20):
+            with self.subTest(i=i):
+                self.cache.connection.execute(
+                    "UPDATE cache SET accessed = accessed - 10 "
+                    "WHERE key != ':1:hot'"
+                )
+                self.cache.get('hot')
+                self.cache.set(f'cold:{i}', i)
+        self.assertEqual(self.cache.get('hot'), 1)
+        entries, = self.cache.connection.execute(
+            'SELECT entries FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(entries, 10)
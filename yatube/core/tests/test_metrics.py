@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import metrics
+
+
+def increment(path, times):
+    with override_settings(METRICS_DATABASE=path):
+        for _ in range(times):
+            metrics.inc('yatube_requests_total', {'view': 'test'})
+        metrics.flush()
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'metrics.sqlite3')
+        self.override = override_settings(METRICS_DATABASE=self.path)
+        self.override.enable()
+        metrics.reset()
+        cache.clear()
+        self.public = Client()
+        self.client.force_login(User.objects.create_user(
+            username='admin', is_staff=True
+        ))
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_request_is_measured(self):
+        author = User.objects.create_user(username='metrics')
+        Post.objects.create(text='Текст', author=author)
+        self.public.get(reverse('posts:posts'))
+        self.public.get(reverse('posts:posts'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        for line in (
+            '# TYPE yatube_request_duration_seconds histogram',
+            'yatube_requests_total{method="GET",status="200",'
+            'view="posts:posts"} 2',
+            'yatube_request_duration_seconds_count{view="posts:posts"} 2',
+            'yatube_request_duration_seconds_bucket{le="+Inf",'
+            'view="posts:posts"} 2',
+            'yatube_response_size_bytes_count{view="posts:posts"} 2',
+            'yatube_template_render_seconds_count{'
+            'template="posts/index.html"} 1',
+            'yatube_cache_requests_total{cache="posts:card",'
+            'result="miss"} 1',
+            'yatube_cache_requests_total{cache="posts:page",'
+            'result="hit"} 1',
+        ):
+            self.assertIn(line, text)
+        self.assertIn('yatube_db_queries_total{view="posts:posts"}', text)
+
+    def test_hidden_from_strangers(self):
+        response = self.public.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+        response = self.public.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_grants_nothing(self):
+        response = self.public.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer '
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_grants_access(self):
+        response = self.public.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_processes_add_up(self):
+        metrics.flush()
+        workers = [
+            multiprocessing.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertIn(
+            'yatube_requests_total{view="test"} 200', metrics.exposition()
+        )
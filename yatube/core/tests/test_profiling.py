@@ -0,0 +1,68 @@
+import marshal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import profiling
+from ..models import ProfileCapture, SlowQuery
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_superuser(
+            username='staff', email='staff@example.com', password='pass'
+        )
+        cls.user = User.objects.create_user(username='reader')
+        Post.objects.create(text='Текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:posts')
+
+    def test_staff_can_profile_a_page(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'_profile': 1})
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(capture.pk))
+        self.assertEqual(capture.view, 'posts:posts')
+        self.assertEqual(capture.user, self.staff)
+        self.assertGreater(capture.queries, 0)
+        self.assertTrue(marshal.loads(bytes(capture.stats)))
+        self.assertIn('cumulative', capture.summary)
+
+    def test_regular_user_is_not_profiled(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {'_profile': 1})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_signed_header_enables_profile(self):
+        self.client.get(self.url, HTTP_X_PROFILE=profiling.make_token())
+        self.client.get(self.url, HTTP_X_PROFILE='forged')
+        self.assertEqual(ProfileCapture.objects.count(), 1)
+
+    def test_admin_downloads_pstats_dump(self):
+        self.client.force_login(self.staff)
+        self.client.get(self.url, {'_profile': 1})
+        capture = ProfileCapture.objects.get()
+        response = self.client.get(reverse(
+            'admin:core_profilecapture_download', args=[capture.pk]
+        ))
+        self.assertEqual(response.content, bytes(capture.stats))
+        response = self.client.get(reverse(
+            'admin:core_profilecapture_change', args=[capture.pk]
+        ))
+        self.assertEqual(response.status_code, 200)
+
+    def test_slow_queries_are_logged_with_plan(self):
+        with mock.patch.object(profiling, 'SLOW_QUERY_THRESHOLD', 0):
+            self.client.get(self.url)
+        query = SlowQuery.objects.filter(sql__contains='posts_post').first()
+        self.assertEqual(query.view, 'posts:posts')
+        self.assertRegex(query.plan, 'SCAN|SEARCH')
@@ -0,0 +1,155 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..middleware import PIN_COOKIE, ReplicaMiddleware
+from ..routers import (MAX_LAG, cache_timeout, reading_from_replica,
+                       record_sync)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = None
+        cache.clear()
+        record_sync('replica', time.time())
+
+    def view(self, request):
+        self.seen = Post.objects.all().db
+        return HttpResponse()
+
+    def writing_view(self, request):
+        Post.objects.filter(pk=0).update(text='')
+        self.seen = Post.objects.all().db
+        return HttpResponse()
+
+    def test_reads_go_to_replica_only_inside_block(self):
+        self.assertEqual(Post.objects.all().db, 'default')
+        with reading_from_replica(['replica']):
+            self.assertEqual(Post.objects.all().db, 'replica')
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_feed_pages_read_from_replica(self):
+        middleware = ReplicaMiddleware(self.view)
+        response = middleware(self.factory.get(reverse('posts:posts')))
+        self.assertEqual(self.seen, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_user_to_primary(self):
+        url = reverse('posts:add_comment', args=[1])
+        response = ReplicaMiddleware(self.view)(self.factory.post(url))
+        self.assertEqual(self.seen, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = self.factory.get(reverse('posts:posts'))
+        request.COOKIES[PIN_COOKIE] = '1'
+        ReplicaMiddleware(self.view)(request)
+        self.assertEqual(self.seen, 'default')
+
+    def test_replica_behind_last_write_is_skipped(self):
+        record_sync('replica', time.time() - 60)
+        url = reverse('posts:add_comment', args=[1])
+        ReplicaMiddleware(self.view)(self.factory.post(url))
+        ReplicaMiddleware(self.view)(
+            self.factory.get(reverse('posts:posts'))
+        )
+        self.assertEqual(self.seen, 'default')
+        record_sync('replica', time.time())
+        ReplicaMiddleware(self.view)(
+            self.factory.get(reverse('posts:posts'))
+        )
+        self.assertEqual(self.seen, 'replica')
+
+    def test_replica_within_lag_serves_reads_under_writes(self):
+        url = reverse('posts:add_comment', args=[1])
+        ReplicaMiddleware(self.view)(self.factory.post(url))
+        response = ReplicaMiddleware(self.view)(
+            self.factory.get(reverse('posts:posts'))
+        )
+        self.assertEqual(self.seen, 'replica')
+        self.assertTrue(response.replica_lagging)
+        pinned = self.factory.get(reverse('posts:posts'))
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        ReplicaMiddleware(self.view)(pinned)
+        self.assertEqual(self.seen, 'default')
+        record_sync('replica', time.time())
+        response = ReplicaMiddleware(self.view)(pinned)
+        self.assertEqual(self.seen, 'replica')
+        self.assertFalse(response.replica_lagging)
+
+    def test_lagging_read_caches_briefly(self):
+        with reading_from_replica(['replica'], lagging=True):
+            self.assertEqual(cache_timeout(3600), MAX_LAG)
+        with reading_from_replica(['replica']):
+            self.assertEqual(cache_timeout(3600), 3600)
+
+    def test_pin_only_after_unsafe_method_or_real_write(self):
+        for name, args in (
+            ('posts:post_create', []),
+            ('posts:add_comment', [1]),
+            ('posts:profile_follow', ['author']),
+        ):
+            with self.subTest(name=name):
+                response = ReplicaMiddleware(self.view)(
+                    self.factory.get(reverse(name, args=args))
+                )
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+        url = reverse('posts:profile_follow', args=['author'])
+        response = ReplicaMiddleware(self.writing_view)(self.factory.get(url))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_follow_link_pins_follower(self):
+        User.objects.create_user(username='author')
+        self.client.force_login(User.objects.create_user(username='reader'))
+        response = self.client.get(
+            reverse('posts:profile_follow', args=['author'])
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_after_write_in_request_use_primary(self):
+        middleware = ReplicaMiddleware(self.writing_view)
+        middleware(self.factory.get(reverse('posts:posts')))
+        self.assertEqual(self.seen, 'default')
+
+    def test_unlisted_views_use_primary(self):
+        ReplicaMiddleware(self.view)(
+            self.factory.get(reverse('posts:search'))
+        )
+        self.assertEqual(self.seen, 'default')
+
+
+class SyncReplicaTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'replica.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_copies_primary_into_replica_file(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Реплицируемый пост', author=author)
+        settings_dict = connections['replica'].settings_dict
+        with mock.patch.dict(settings_dict, NAME=self.path):
+            call_command('sync_replica', 'replica', stdout=StringIO())
+        replica = sqlite3.connect(self.path)
+        self.assertEqual(
+            replica.execute('SELECT text FROM posts_post').fetchall(),
+            [('Реплицируемый пост',)],
+        )
+        replica.close()
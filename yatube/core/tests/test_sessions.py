@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import User
+
+from .. import sessions
+
+
+class CachedSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret'
+        )
+        self.client.post(
+            reverse('users:login'),
+            {'username': 'reader', 'password': 'secret'},
+        )
+        self.url = reverse('about:author')
+
+    def queries(self, client=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = (client or self.client).get(self.url)
+        return response, [query['sql'] for query in captured]
+
+    def test_logged_in_request_skips_database(self):
+        self.client.get(self.url)
+        response, queries = self.queries()
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertEqual(queries, [])
+
+    def test_session_written_behind_and_read_after_eviction(self):
+        key = self.client.session.session_key
+        self.assertTrue(Session.objects.filter(session_key=key).exists())
+        cache.clear()
+        response, _ = self.queries()
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_login_written_through(self):
+        store = sessions.SessionStore()
+        store.create()
+        self.assertTrue(Session.objects.filter(
+            session_key=store.session_key
+        ).exists())
+        store[SESSION_KEY] = str(self.user.pk)
+        store.save()
+        self.assertNotIn(store.session_key, sessions._pending)
+        self.assertEqual(
+            Session.objects.get(
+                session_key=store.session_key
+            ).get_decoded()[SESSION_KEY],
+            str(self.user.pk),
+        )
+
+    def test_failed_flush_keeps_sessions_queued(self):
+        store = self.client.session
+        store['note'] = 'touch'
+        store.save()
+        with mock.patch.object(
+            sessions, '_write', side_effect=DatabaseError('locked')
+        ):
+            with self.assertRaises(DatabaseError):
+                sessions.flush_pending()
+        self.assertIn(store.session_key, sessions._pending)
+        self.assertEqual(sessions.flush_pending(), 1)
+        self.assertEqual(
+            Session.objects.get(
+                session_key=store.session_key
+            ).get_decoded()['note'],
+            'touch',
+        )
+
+    def test_logout_is_not_undone_by_pending_write(self):
+        store = self.client.session
+        store['note'] = 'before logout'
+        store.save()
+        # Та же запись, отложенная другим процессом.
+        pending = dict(sessions._pending)
+        self.client.get(reverse('users:logout'))
+        sessions._pending.update(pending)
+        sessions.flush_pending()
+        self.assertFalse(
+            Session.objects.filter(session_key=store.session_key).exists()
+        )
+        response, _ = self.queries()
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_stale_cookie_checked_once(self):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'x' * 32
+        self.queries()
+        response, queries = self.queries()
+        self.assertFalse(response.context['user'].is_authenticated)
+        self.assertEqual(queries, [])
+
+    def test_user_cache_dropped_on_save(self):
+        self.client.get(self.url)
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        response, queries = self.queries()
+        self.assertEqual(response.context['user'].first_name, 'Новое имя')
+        self.assertEqual(len(queries), 1)
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get(self.url)
+        self.user.set_password('changed')
+        self.user.save()
+        response, _ = self.queries()
+        self.assertFalse(response.context['user'].is_authenticated)
@@ -0,0 +1,60 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from posts.models import Group, Post, User
+
+from ..db.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        self.wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path}, alias='file'
+        )
+
+    def tearDown(self):
+        self.wrapper.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_from_settings(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('mmap_size'), 256 * 1024 * 1024)
+
+    def test_transactions_take_write_lock_upfront(self):
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        with self.assertRaises(sqlite3.OperationalError):
+            other.execute('BEGIN IMMEDIATE')
+        other.close()
+        self.wrapper.connection.rollback()
+
+
+class MaintenanceCommandTests(TransactionTestCase):
+    def test_reports_index_usage(self):
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(text='Текст', author=author, group=group)
+        out = StringIO()
+        call_command('sqlite_maintenance', index_usage=True, stdout=out)
+        output = out.getvalue()
+        self.assertIn('ANALYZE', output)
+        self.assertIn('incremental_vacuum: освобождено', output)
+        self.assertRegex(output, r'[1-9]\d*  post_pub_date_idx')
@@ -1,4 +1,15 @@
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.static import serve
+
+from . import metrics
+
+# Имена картинок постов и миниатюр sorl зависят от содержимого.
+IMMUTABLE_MEDIA = re.compile(r'^(posts/[0-9a-f]{2}/|cache/)')
 
 
 def page_not_found(request, exception):
@@ -11,3 +22,34 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def media(request, path, document_root=None):
+    """static.serve для DEBUG с вечным кешем неизменяемых файлов."""
+    response = serve(request, path, document_root=document_root)
+    if response.status_code == 200 and IMMUTABLE_MEDIA.match(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def can_see_metrics(request):
+    """Сотрудник сайта или сборщик с METRICS_TOKEN в Authorization.
+
+    Адрес клиента не проверяется: за обратным прокси все запросы
+    приходят с 127.0.0.1.
+    """
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not can_see_metrics(request):
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
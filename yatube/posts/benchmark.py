@@ -0,0 +1,317 @@
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import search
+from .images import normalize
+from .models import Group, Post, User
+from .storage import content_path
+from .transfer import Importer
+from .urls import urlpatterns
+
+PREFIX = 'bench'
+WORDS = (
+    'яндекс практикум джанго лента подписка пост группа автор комментарий '
+    'кеш индекс запрос страница картинка поиск профиль'
+).split()
+
+
+def _zipf(rng, size, exponent):
+    """Индекс от 0 до size-1: малые номера выпадают гораздо чаще."""
+    weights = [1 / (rank + 1) ** exponent for rank in range(size)]
+    return rng.choices(range(size), weights, k=1)[0]
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _images(rng, count):
+    """Несколько картинок в хранилище; посты ссылаются на них по имени."""
+    storage = Post._meta.get_field('image').storage
+    names = []
+    for i in range(count):
+        buffer = BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+        upload = ContentFile(buffer.getvalue(), name=f'{PREFIX}{i}.jpg')
+        upload.content_type = 'image/jpeg'
+        content = normalize(upload)
+        if not isinstance(content, str):
+            name = content_path(None, content.name)
+            content = storage.save(name, content)
+        names.append(content)
+    return names
+
+
+def seed_rows(users=100, posts=2000, comments=5000, follows=2000,
+              image_share=0.2, seed=0):
+    """Строки в формате transfer: граф со степенным распределением.
+
+    Немногие авторы пишут большую часть постов и собирают большую часть
+    подписчиков, как в живой ленте.
+    """
+    rng = random.Random(seed)
+    names = [f'{PREFIX}_{i}' for i in range(users)]
+    groups = [f'{PREFIX}-{i}' for i in range(max(1, users // 20))]
+    images = _images(rng, 5)
+    for slug in groups:
+        yield {
+            'model': 'group', 'title': slug, 'slug': slug,
+            'description': _text(rng, 12),
+        }
+    start = timezone.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(posts, 1)
+    for pk in range(1, posts + 1):
+        created = start + step * pk
+        yield {
+            'model': 'post', 'id': pk,
+            'text': _text(rng, rng.randint(5, 400)),
+            'pub_date': created.isoformat(),
+            'updated': created.isoformat(),
+            'image': rng.choice(images) if rng.random() < image_share else '',
+            'author_name': names[_zipf(rng, users, 1.1)],
+            'group_slug': rng.choice(groups + [None]),
+        }
+    for _ in range(comments):
+        post = _zipf(rng, posts, 0.8) + 1
+        yield {
+            'model': 'comment', 'post_id': post,
+            'text': _text(rng, rng.randint(3, 40)),
+            'created': (start + step * post).isoformat(),
+            'author_name': rng.choice(names),
+        }
+    for _ in range(follows):
+        yield {
+            'model': 'follow',
+            'user_name': rng.choice(names),
+            'author_name': names[_zipf(rng, users, 1.2)],
+        }
+
+
+def seed(progress=None, **options):
+    total = Importer(progress=progress).load(seed_rows(**options))
+    search.rebuild()
+    return total
+
+
+def targets(prefix=PREFIX):
+    """Все именованные адреса posts.urls с аргументами из базы."""
+    post = Post.objects.filter(author__username__startswith=prefix).first()
+    group = Group.objects.filter(slug__startswith=prefix).first()
+    author = User.objects.filter(
+        username__startswith=prefix
+    ).order_by('-stats__followers_count').first()
+    if post is None or group is None or author is None:
+        return {}
+    kwargs = {
+        'slug': group.slug, 'username': author.username, 'post_id': post.pk,
+    }
+    urls = {}
+    for pattern in urlpatterns:
+        names = pattern.pattern.converters
+        args = {name: kwargs[name] for name in names}
+        urls[pattern.name] = reverse(f'posts:{pattern.name}', kwargs=args)
+    urls['search'] += '?q=' + WORDS[0]
+    return urls
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    index = min(len(values) - 1, round(share * (len(values) - 1)))
+    return values[index]
+
+
+def measure(url, requests=50, user=None, cold=False):
+    client = Client(HTTP_HOST='localhost')
+    if user is not None:
+        client.force_login(user)
+    timings = []
+    queries = []
+    for _ in range(requests):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+        queries.append(len(captured))
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    client.get(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'p50': _percentile(timings, 0.5) * 1000,
+        'p95': _percentile(timings, 0.95) * 1000,
+        'p99': _percentile(timings, 0.99) * 1000,
+        'rps': len(timings) / sum(timings),
+        'queries': statistics.median(queries),
+        'peak_kb': peak / 1024,
+    }
+
+
+def run(requests=50, username=None, cold=False, names=None):
+    user = None
+    if username is not None:
+        user = User.objects.get(username=username)
+    return {
+        name: measure(url, requests, user, cold)
+        for name, url in targets().items()
+        if not names or name in names
+    }
+
+
+def sessions(requests=20, username=None):
+    """Запросы к базе на адрес: сессии и пользователь из базы и из кеша.
+
+    Без username запросы идут от автора с наибольшим числом
+    подписчиков: гостю сессия не нужна вовсе.
+    """
+    if username is None:
+        user = User.objects.filter(
+            username__startswith=PREFIX
+        ).order_by('-stats__followers_count').first()
+    else:
+        user = User.objects.get(username=username)
+    if user is None:
+        return {}
+    stock = override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.db',
+        MIDDLEWARE=[
+            'django.contrib.auth.middleware.AuthenticationMiddleware'
+            if path == 'core.auth.AuthenticationMiddleware' else path
+            for path in settings.MIDDLEWARE
+        ],
+    )
+    results = {}
+    for name, url in targets().items():
+        with stock:
+            before = measure(url, requests, user)
+        after = measure(url, requests, user)
+        results[name] = {
+            'status': after['status'],
+            'db': before['queries'],
+            'cached': after['queries'],
+            'db_p50': before['p50'],
+            'cached_p50': after['p50'],
+        }
+    return results
+
+
+def _mixed_worker(urls, post_ids, user, deadline, write_share, seed,
+                  results):
+    rng = random.Random(seed)
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(user)
+    try:
+        while time.perf_counter() < deadline:
+            write = rng.random() < write_share
+            started = time.perf_counter()
+            try:
+                if write:
+                    response = client.post(
+                        reverse('posts:add_comment', args=[
+                            rng.choice(post_ids)
+                        ]),
+                        {'text': _text(rng, 8)},
+                    )
+                else:
+                    response = client.get(rng.choice(urls))
+                outcome = 'ok' if response.status_code < 400 else str(
+                    response.status_code
+                )
+            except Exception as error:
+                outcome = type(error).__name__ + ': ' + str(error)
+            elapsed = time.perf_counter() - started
+            results.append(('write' if write else 'read', outcome, elapsed))
+    finally:
+        connections.close_all()
+
+
+def mixed(seconds=10, threads=4, write_share=0.2, seed=0):
+    """Параллельные чтения лент и запись комментариев.
+
+    Каждый поток — отдельное соединение с базой, как у процессов
+    сервера. Возвращает задержки чтения и записи и все ошибки,
+    например «database is locked».
+    """
+    urls = [
+        url for name, url in targets().items()
+        if name in ('posts', 'groups', 'profile', 'post_detail')
+    ]
+    post_ids = list(Post.objects.filter(
+        author__username__startswith=PREFIX
+    ).values_list('pk', flat=True)[:100])
+    users = list(User.objects.filter(
+        username__startswith=PREFIX
+    )[:threads])
+    if not urls or not users:
+        return {}
+    results = []
+    deadline = time.perf_counter() + seconds
+    workers = [
+        threading.Thread(target=_mixed_worker, args=(
+            urls, post_ids, users[i % len(users)], deadline, write_share,
+            seed + i, results,
+        ))
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    report = {'errors': {}}
+    for kind in ('read', 'write'):
+        timings = [
+            elapsed for done, outcome, elapsed in results
+            if done == kind and outcome == 'ok'
+        ]
+        report[kind] = {
+            'count': len(timings),
+            'p50': _percentile(timings, 0.5) * 1000 if timings else 0,
+            'p95': _percentile(timings, 0.95) * 1000 if timings else 0,
+            'rps': len(timings) / seconds,
+        }
+    for _, outcome, _ in results:
+        if outcome != 'ok':
+            report['errors'][outcome] = report['errors'].get(outcome, 0) + 1
+    return report
+
+
+def regressions(baseline, current, threshold=0.2):
+    """Регрессии относительно прошлого запуска.
+
+    Регрессия — рост p95 больше чем на долю threshold или рост числа
+    запросов к базе.
+    """
+    found = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['p95'] > before['p95'] * (1 + threshold):
+            found.append(
+                f"{name}: p95 {before['p95']:.1f} → {result['p95']:.1f} мс"
+            )
+        if result['queries'] > before['queries']:
+            found.append(
+                f"{name}: запросов {before['queries']} → {result['queries']}"
+            )
+    return found
@@ -0,0 +1,94 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import iri_to_uri
+
+FEED_CACHE_TIMEOUT = getattr(settings, 'POSTS_FEED_CACHE_TIMEOUT', 60 * 60)
+CARD_CACHE_TIMEOUT = getattr(
+    settings, 'POSTS_CARD_CACHE_TIMEOUT', 60 * 60 * 24
+)
+PAGE_CACHE_TIMEOUT = getattr(settings, 'POSTS_PAGE_CACHE_TIMEOUT', 60 * 5)
+
+
+def _version_key(scope):
+    return f'posts:feed-version:{scope}'
+
+
+def _modified_key(scope):
+    return f'posts:feed-modified:{scope}'
+
+
+def feed_version(scope):
+    """Текущее поколение ленты; новый счётчик начинается с метки времени.
+
+    Так потерянный из кеша счётчик не вернётся к уже выданным значениям.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_feed(*scopes):
+    now = time.time()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(now * 1000), None)
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def feed_modified(scope):
+    """Время последнего изменения ленты или None, если оно неизвестно."""
+    return cache.get(_modified_key(scope))
+
+
+def post_scopes(post, previous_group_id=None):
+    """Ленты, в которых показан пост."""
+    scopes = {'index', f'profile:{post.author_id}'}
+    for group_id in (post.group_id, previous_group_id):
+        if group_id is not None:
+            scopes.add(f'group:{group_id}')
+    return scopes
+
+
+def feed_cache_key(request, scope):
+    """Ключ фрагмента ленты: поколение ленты и положение на ней."""
+    return ':'.join((
+        str(feed_version(scope)),
+        request.GET.get('cursor', ''),
+        request.GET.get('page', ''),
+    ))
+
+
+def card_cache_key(post, variant):
+    """Ключ карточки: пост, момент его изменения и имя автора.
+
+    Автор загружен вместе с постом, поэтому смена имени меняет ключ без
+    отдельного запроса.
+    """
+    name = hashlib.md5(post.author.get_full_name().encode()).hexdigest()
+    return (
+        f'posts:card:{variant}:{post.pk}:{post.updated.timestamp()}:'
+        f'{name[:8]}'
+    )
+
+
+def current_versions(scopes):
+    """Поколения нескольких лент одним обращением к кешу."""
+    keys = {_version_key(scope): scope for scope in scopes}
+    return {
+        keys[key]: version
+        for key, version in cache.get_many(list(keys)).items()
+    }
+
+
+def page_cache_key(request):
+    path = hashlib.md5(iri_to_uri(request.get_full_path()).encode())
+    return f'posts:page:{path.hexdigest()}'
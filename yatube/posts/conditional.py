@@ -0,0 +1,94 @@
+from functools import wraps
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from .caching import feed_modified, feed_version
+from .models import Group, Post, User
+from .sharding import post_db
+
+
+def _viewer(request):
+    return request.user.pk if request.user.is_authenticated else 0
+
+
+def _feed(request, scope):
+    if scope is None:
+        return None
+    version = feed_version(scope)
+    etag = f'{version}-{_viewer(request)}'
+    return etag, feed_modified(scope), {scope: version}
+
+
+def index(request):
+    return _feed(request, 'index')
+
+
+def group_posts(request, slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    return _feed(request, pk and f'group:{pk}')
+
+
+def profile(request, username):
+    pk = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    return _feed(request, pk and f'profile:{pk}')
+
+
+def post_detail(request, post_id):
+    """Пост меняется при правке и новом комментарии, автор — с профилем."""
+    row = Post.objects.using(post_db(post_id)).filter(
+        pk=post_id
+    ).values_list(
+        'updated', 'author_id'
+    ).first()
+    if row is None:
+        return None
+    updated, author_id = row
+    scope = f'profile:{author_id}'
+    version = feed_version(scope)
+    etag = f'{updated.timestamp()}-{version}-{_viewer(request)}'
+    return etag, updated.timestamp(), {scope: version}
+
+
+def conditional(validators):
+    """Отвечает 304, не вызывая view, если страница у клиента актуальна.
+
+    validators(request, *args, **kwargs) возвращает (etag, last_modified,
+    поколения лент) или None; ETag включает пользователя, поэтому ответ
+    зависит от Cookie. Поколения, прочитанные до рендера, сохраняются в
+    response.feed_versions для кеша страниц.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            result = validators(request, *args, **kwargs)
+            if result is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified, versions = result
+            etag = quote_etag(etag)
+            if last_modified is not None:
+                last_modified = int(last_modified)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                response.feed_versions = versions
+            if response.status_code in (200, 304):
+                response.setdefault('ETag', etag)
+                if last_modified is not None:
+                    response.setdefault(
+                        'Last-Modified', http_date(last_modified)
+                    )
+                patch_vary_headers(response, ('Cookie',))
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True)
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
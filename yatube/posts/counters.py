@@ -0,0 +1,184 @@
+from collections import Counter
+
+from django.db import connections, router
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import sharding
+from .models import Comment, Follow, Post, User, UserStats, shard_aliases
+
+BATCH_SIZE = 500
+
+
+def _count(queryset, field):
+    # Без order_by() Meta.ordering попадает в GROUP BY и дробит группы.
+    counted = queryset.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field)
+    return Coalesce(
+        Subquery(
+            counted.annotate(total=Count('*')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _post_aliases():
+    # None — база по умолчанию через роутеры, как без шардирования.
+    return shard_aliases() or [None]
+
+
+def shard_post_totals(user_ids=None):
+    """Число постов по авторам, сложенное по всем шардам."""
+    totals = Counter()
+    for alias in shard_aliases():
+        posts = Post.objects.using(alias).order_by()
+        if user_ids is not None:
+            posts = posts.filter(author_id__in=user_ids)
+        totals.update(dict(posts.values('author_id').annotate(
+            total=Count('*')
+        ).values_list('author_id', 'total')))
+    return totals
+
+
+def user_counts():
+    """Точные значения счётчиков пользователей, посчитанные по таблицам."""
+    return User.objects.annotate(
+        posts_total=_count(Post.objects.all(), 'author'),
+        followers_total=_count(Follow.objects.all(), 'author'),
+        following_total=_count(Follow.objects.all(), 'user'),
+    )
+
+
+def post_counts():
+    return Post.objects.annotate(
+        comments_total=_count(Comment.objects.all(), 'post'),
+    )
+
+
+def rebuild_user(user_id):
+    counts = user_counts().filter(pk=user_id).values(
+        'posts_total', 'followers_total', 'following_total'
+    ).first()
+    if counts is None:
+        return None
+    if sharding.enabled():
+        counts['posts_total'] = shard_post_totals([user_id])[user_id]
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': counts['posts_total'],
+            'followers_count': counts['followers_total'],
+            'following_count': counts['following_total'],
+        },
+    )
+    return stats
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающая строка пересчитывается."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return rebuild_user(user.pk)
+
+
+def _bump(queryset, deltas, **values):
+    """Атомарно сдвигает счётчики, не опуская их ниже нуля."""
+    queryset.filter(**{
+        f'{field}__gte': -delta
+        for field, delta in deltas.items() if delta < 0
+    }).update(**values, **{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def bump_user(user_id, **deltas):
+    _bump(UserStats.objects.filter(user_id=user_id), deltas)
+
+
+def drop_follower(author_id):
+    """Уменьшает число подписчиков автора и возвращает новое значение.
+
+    Значение берётся из того же UPDATE, поэтому при одновременных
+    отписках каждая видит своё. None — строки счётчиков у автора нет.
+    """
+    table = UserStats._meta.db_table
+    using = router.db_for_write(UserStats)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET followers_count = followers_count - 1 '
+            f'WHERE user_id = %s AND followers_count >= 1 '
+            f'RETURNING followers_count',
+            [author_id],
+        )
+        row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+
+def bump_post(post_id, delta):
+    """Сдвигает счётчик комментариев и «касается» поста.
+
+    Новое значение updated сбрасывает закешированную карточку поста.
+    """
+    _bump(
+        Post.objects.using(sharding.post_db(post_id)).filter(pk=post_id),
+        {'comments_count': delta},
+        updated=timezone.now(),
+    )
+
+
+def mismatches():
+    """Строки, где сохранённые счётчики разошлись с данными."""
+    users = user_counts().values_list(
+        'pk', 'stats__posts_count', 'posts_total',
+        'stats__followers_count', 'followers_total',
+        'stats__following_count', 'following_total',
+    )
+    posts_totals = shard_post_totals() if sharding.enabled() else None
+    for row in users.iterator():
+        pk, values = row[0], list(row[1:])
+        if posts_totals is not None:
+            values[1] = posts_totals[pk]
+        if any(values[i] != values[i + 1] for i in range(0, 6, 2)):
+            yield 'user', pk
+    for alias in _post_aliases():
+        posts = post_counts().using(alias).exclude(
+            comments_count=F('comments_total')
+        )
+        for pk in posts.values_list('pk', flat=True).iterator():
+            yield 'post', pk
+
+
+def rebuild():
+    """Пересчитывает все счётчики одним UPDATE на таблицу.
+
+    При шардировании посты считаются на каждом шарде и складываются,
+    а комментарии считаются на шарде своего поста.
+    """
+    missing = User.objects.filter(stats__isnull=True)
+    UserStats.objects.bulk_create(
+        UserStats(user_id=pk)
+        for pk in missing.values_list('pk', flat=True).iterator()
+    )
+    counts = {
+        'followers_count': _count(Follow.objects.all(), 'author'),
+        'following_count': _count(Follow.objects.all(), 'user'),
+    }
+    if not sharding.enabled():
+        counts['posts_count'] = _count(Post.objects.all(), 'author')
+    UserStats.objects.update(**counts)
+    if sharding.enabled():
+        totals = shard_post_totals()
+        stats = list(UserStats.objects.only('pk'))
+        for row in stats:
+            row.posts_count = totals[row.pk]
+        UserStats.objects.bulk_update(
+            stats, ['posts_count'], batch_size=BATCH_SIZE
+        )
+    for alias in _post_aliases():
+        Post.objects.using(alias).update(
+            comments_count=_count(Comment.objects.all(), 'post'),
+        )
@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from . import sharding
+from .models import FeedEntry, Follow, Post, UserStats
+
+# Авторы, у которых подписчиков больше этого числа, в ленты не
+# раскладываются: их посты подмешиваются при чтении.
+FANOUT_LIMIT = getattr(settings, 'POSTS_FEED_FANOUT_LIMIT', 1000)
+
+FEED_ORDERING = ('-feed_date', '-feed_post_id')
+
+
+def is_fanout_author(author_id):
+    return not UserStats.objects.filter(
+        user_id=author_id, followers_count__gt=FANOUT_LIMIT
+    ).exists()
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков одним INSERT."""
+    if sharding.enabled() or not is_fanout_author(post.author_id):
+        return 0
+    return _execute(
+        f'INSERT INTO {FeedEntry._meta.db_table} (user_id, post_id, pub_date) '
+        f'SELECT user_id, %s, %s FROM {Follow._meta.db_table} '
+        f'WHERE author_id = %s',
+        [post.pk, post.pub_date, post.author_id],
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    if sharding.enabled() or not is_fanout_author(author_id):
+        return 0
+    feed = FeedEntry._meta.db_table
+    return _execute(
+        f'INSERT INTO {feed} (user_id, post_id, pub_date) '
+        f'SELECT %s, p.id, p.pub_date FROM {Post._meta.db_table} p '
+        f'WHERE p.author_id = %s AND NOT EXISTS ('
+        f'SELECT 1 FROM {feed} e WHERE e.user_id = %s AND e.post_id = p.id)',
+        [user_id, author_id, user_id],
+    )
+
+
+def _insert_follow_posts(where, params):
+    # Пары подписка × пост автора, кроме «звёзд» и уже разложенных.
+    feed = FeedEntry._meta.db_table
+    return _execute(
+        f'INSERT INTO {feed} (user_id, post_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f '
+        f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+        f'WHERE {where} AND NOT EXISTS ('
+        f'SELECT 1 FROM {UserStats._meta.db_table} s '
+        f'WHERE s.user_id = p.author_id AND s.followers_count > %s) '
+        f'AND NOT EXISTS (SELECT 1 FROM {feed} e '
+        f'WHERE e.user_id = f.user_id AND e.post_id = p.id)',
+        [*params, FANOUT_LIMIT],
+    )
+
+
+def backfill_followers(author_id):
+    """Добавляет посты автора в ленты всех его подписчиков одним INSERT.
+
+    Нужен, когда автор перестаёт быть «звездой»: его посты того времени
+    в ленты не раскладывались.
+    """
+    if sharding.enabled():
+        return 0
+    return _insert_follow_posts('f.author_id = %s', [author_id])
+
+
+def prune(user_id, author_id):
+    return FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()[0]
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты целиком; нужен после массовых операций."""
+    entries = FeedEntry.objects.all()
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    entries.delete()
+    total = 0
+    for user_id, author_id in follows.values_list('user_id', 'author_id'):
+        total += backfill(user_id, author_id)
+    return total
+
+
+def fan_out_range(first_id, last_id):
+    """Раскладывает посты с id из [first_id, last_id] одним INSERT.
+
+    Нужен после bulk_create, который не посылает сигналов.
+    """
+    if sharding.enabled():
+        return 0
+    return _insert_follow_posts(
+        'p.id BETWEEN %s AND %s', [first_id, last_id]
+    )
+
+
+def backfill_follows(after_id):
+    """Заполняет ленты по подпискам с id больше after_id одним INSERT."""
+    if sharding.enabled():
+        return 0
+    return _insert_follow_posts('f.id > %s', [after_id])
+
+
+def feed_querysets(user):
+    """Материализованная лента и посты «звёзд», собранные на чтении.
+
+    Оба queryset-а отдают ключ (feed_date, feed_post_id), по которому
+    CursorPaginator сливает их в одну страницу. При шардировании лента
+    целиком собирается на чтении: по queryset-у на шард.
+    """
+    if sharding.enabled():
+        return [
+            queryset.annotate(feed_date=F('pub_date'), feed_post_id=F('id'))
+            for queryset in sharding.follow_querysets(Follow.objects.filter(
+                user=user
+            ).values_list('author_id', flat=True))
+        ]
+    celebrities = list(Follow.objects.filter(
+        user=user, author__stats__followers_count__gt=FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    posts = Post.objects.cards()
+    materialized = posts.filter(feed_entries__user=user).annotate(
+        feed_date=F('feed_entries__pub_date'),
+        feed_post_id=F('feed_entries__post'),
+    )
+    if not celebrities:
+        return [materialized]
+    on_read = posts.filter(author__in=celebrities).annotate(
+        feed_date=F('pub_date'),
+        feed_post_id=F('id'),
+    )
+    return [materialized.exclude(author__in=celebrities), on_read]
@@ -0,0 +1,53 @@
+from django.db import connections, router
+from django.db.models.signals import post_delete, post_save
+
+from .models import Follow, User
+
+
+def _execute(sql, params):
+    using = router.db_for_write(Follow)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    follow = Follow(id=row[0], user_id=params[0], author_id=row[1])
+    follow._state.adding = False
+    follow._state.db = using
+    return follow
+
+
+def follow(user, username):
+    """Подписка одним INSERT; повторная подписка ничего не делает.
+
+    Возвращает новую подписку или None, если ничего не изменилось.
+    Сигналы отправляются вручную: счётчики и ленты ведут обработчики.
+    """
+    follow = _execute(
+        f'INSERT INTO {Follow._meta.db_table} (user_id, author_id) '
+        f'SELECT %s, id FROM {User._meta.db_table} '
+        f'WHERE username = %s AND id != %s '
+        f'ON CONFLICT DO NOTHING RETURNING id, author_id',
+        [user.pk, username, user.pk],
+    )
+    if follow is not None:
+        post_save.send(
+            sender=Follow, instance=follow, created=True,
+            update_fields=None, raw=False, using=follow._state.db,
+        )
+    return follow
+
+
+def unfollow(user, username):
+    """Отписка одним DELETE; возвращает удалённую подписку или None."""
+    follow = _execute(
+        f'DELETE FROM {Follow._meta.db_table} WHERE user_id = %s '
+        f'AND author_id = (SELECT id FROM {User._meta.db_table} '
+        f'WHERE username = %s) RETURNING id, author_id',
+        [user.pk, username],
+    )
+    if follow is not None:
+        post_delete.send(
+            sender=Follow, instance=follow, using=follow._state.db
+        )
+    return follow
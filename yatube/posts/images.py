@@ -0,0 +1,199 @@
+import hashlib
+import os
+import re
+import threading
+from collections import Counter
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.signals import request_finished
+from django.db import connections, router, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from .models import ImageBlob, Post, shard_aliases
+
+MAX_SIDE = getattr(settings, 'POSTS_IMAGE_MAX_SIDE', 1920)
+MAX_PIXELS = getattr(settings, 'POSTS_IMAGE_MAX_PIXELS', 40_000_000)
+MAX_BYTES = getattr(settings, 'POSTS_IMAGE_MAX_BYTES', 1024 * 1024)
+JPEG_QUALITIES = (85, 75, 65, 55)
+
+# Ссылки на уже сохранённые файлы, взятые формами этого потока.
+_reserved = threading.local()
+
+
+def digest(upload):
+    """SHA-256 загрузки за один проход по её кускам."""
+    sha = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha.update(chunk)
+    upload.seek(0)
+    return sha.hexdigest()
+
+
+def _encode(image):
+    """Кодирует картинку без метаданных, укладываясь в MAX_BYTES."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        buffer = BytesIO()
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    image = image.convert('RGB')
+    for quality in JPEG_QUALITIES:
+        buffer = BytesIO()
+        image.save(
+            buffer, 'JPEG', quality=quality, optimize=True, progressive=True
+        )
+        if buffer.tell() <= MAX_BYTES:
+            break
+    return buffer.getvalue(), 'jpg'
+
+
+def normalize(upload):
+    """Готовит загруженную картинку к хранению.
+
+    Возвращает имя уже сохранённого файла, если такую картинку загружали,
+    иначе перекодированный файл с именем по хешу загрузки.
+    """
+    upload_digest = digest(upload)
+    known = _reserve(upload_digest)
+    if known is not None:
+        return known
+    try:
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > MAX_PIXELS:
+            raise forms.ValidationError(
+                'Слишком большое изображение: %(width)s×%(height)s.',
+                params={'width': width, 'height': height},
+            )
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError):
+        raise forms.ValidationError('Не удалось прочитать изображение.')
+    data, extension = _encode(image)
+    return ContentFile(data, name=f'{upload_digest}.{extension}')
+
+
+def name_digest(name):
+    """Хеш загрузки из имени файла; у старых картинок его нет."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return stem if re.fullmatch(r'[0-9a-f]{64}', stem) else ''
+
+
+def _execute(sql, params):
+    using = router.db_for_write(ImageBlob)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() if cursor.description else cursor.rowcount
+
+
+def _reserve(upload_digest):
+    """Имя файла с таким хешем и ссылка на него за один UPDATE.
+
+    Ссылка не даёт удалить файл, пока форма дойдёт до сохранения поста;
+    acquire() для этого имени её забирает, а невостребованные ссылки
+    снимаются по окончании запроса.
+    """
+    table = ImageBlob._meta.db_table
+    row = _execute(
+        f'UPDATE {table} SET refs = refs + 1 WHERE id = ('
+        f'SELECT id FROM {table} WHERE digest = %s AND refs > 0 LIMIT 1'
+        f') RETURNING name',
+        [upload_digest],
+    )
+    if row is None:
+        return None
+    _reserved.names = getattr(_reserved, 'names', []) + [row[0]]
+    return row[0]
+
+
+def acquire(name):
+    if not name:
+        return
+    reserved = getattr(_reserved, 'names', [])
+    if name in reserved:
+        reserved.remove(name)
+        return
+    _execute(
+        f'INSERT INTO {ImageBlob._meta.db_table} (name, digest, refs) '
+        f'VALUES (%s, %s, 1) '
+        f'ON CONFLICT (name) DO UPDATE SET refs = refs + 1',
+        [name, name_digest(name)],
+    )
+
+
+def release(name):
+    """Снимает ссылку; последний пост уносит с собой файл.
+
+    Строка удаляется, только если ссылок так и не появилось: пока
+    они есть, файл не трогается.
+    """
+    if not name:
+        return
+    table = ImageBlob._meta.db_table
+    using = router.db_for_write(ImageBlob)
+    with transaction.atomic(using=using):
+        _execute(
+            f'UPDATE {table} SET refs = refs - 1 '
+            f'WHERE name = %s AND refs > 0',
+            [name],
+        )
+        deleted = _execute(
+            f'DELETE FROM {table} WHERE name = %s AND refs = 0', [name]
+        )
+        if deleted:
+            storage = Post._meta.get_field('image').storage
+            transaction.on_commit(lambda: storage.delete(name), using=using)
+
+
+@receiver(request_finished)
+def release_reserved(sender, **kwargs):
+    """Снимает ссылки форм, которые так и не сохранили пост."""
+    names = getattr(_reserved, 'names', [])
+    _reserved.names = []
+    for name in names:
+        release(name)
+
+
+def recount():
+    """Пересчитывает ссылки на файлы после массовой загрузки постов."""
+    if shard_aliases():
+        return _recount_shards()
+    names = Post.objects.exclude(image='').exclude(
+        image__in=ImageBlob.objects.values('name')
+    ).order_by().values_list('image', flat=True).distinct()
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name, digest=name_digest(name))
+        for name in names.iterator()
+    )
+    refs = Post.objects.filter(image=OuterRef('name')).order_by().values(
+        'image'
+    ).annotate(total=Count('*')).values('total')
+    ImageBlob.objects.update(refs=Coalesce(
+        Subquery(refs, output_field=IntegerField()), 0
+    ))
+
+
+def _recount_shards():
+    # Посты на шардах, а файлы в default: подзапрос не дотянется,
+    # поэтому ссылки складываются здесь.
+    refs = Counter()
+    for alias in shard_aliases():
+        refs.update(dict(
+            Post.objects.using(alias).exclude(image='').order_by().values(
+                'image'
+            ).annotate(total=Count('*')).values_list('image', 'total')
+        ))
+    known = set(ImageBlob.objects.values_list('name', flat=True))
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name, digest=name_digest(name))
+        for name in refs if name not in known
+    )
+    blobs = list(ImageBlob.objects.only('pk', 'name', 'refs'))
+    for blob in blobs:
+        blob.refs = refs.get(blob.name, 0)
+    ImageBlob.objects.bulk_update(blobs, ['refs'], batch_size=500)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post, shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры для уже опубликованных постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', dest='rebuild',
+            help='Строить заново и уже готовые миниатюры.',
+        )
+
+    def handle(self, *args, rebuild=False, **options):
+        seen = set()
+        built = failed = 0
+        for alias in shard_aliases() or [None]:
+            names = Post.objects.using(alias).exclude(image='').order_by(
+                'image'
+            ).values_list('image', flat=True).distinct()
+            for name in names.iterator():
+                if name in seen:
+                    continue
+                seen.add(name)
+                if not rebuild and thumbnails.is_built(name):
+                    continue
+                try:
+                    thumbnails.generate(name)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                built += 1
+                # Сбрасываются карточки всех постов с этой картинкой.
+                thumbnails._touch(name)
+        self.stdout.write(f'Построено: {built}, ошибок: {failed}')
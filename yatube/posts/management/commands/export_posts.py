@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки; .gz сжимается, - пишет в stdout.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE
+        )
+
+    def handle(self, *args, path, batch_size, **options):
+        with transfer.open_stream(path, 'w') as stream:
+            total = transfer.export(
+                stream, batch_size,
+                progress=lambda done: self.stderr.write(f'... {done}'),
+            )
+        self.stderr.write(f'Выгружено строк: {total}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку export_posts пачками bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки; .gz распаковывается, - из stdin.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE
+        )
+
+    def handle(self, *args, path, batch_size, **options):
+        importer = transfer.Importer(
+            batch_size,
+            progress=lambda done: self.stdout.write(f'... {done}'),
+        )
+        with transfer.open_stream(path, 'r') as stream:
+            total = importer.run(stream)
+        self.stdout.write(f'Загружено строк: {total}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и проверяет денормализованные счётчики.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя.',
+        )
+
+    def handle(self, *args, check=False, **options):
+        if not check:
+            counters.rebuild()
+        broken = list(counters.mismatches())
+        for kind, pk in broken:
+            self.stderr.write(f'Счётчики расходятся: {kind} {pk}')
+        if broken:
+            raise CommandError(f'Расхождений: {len(broken)}')
+        self.stdout.write('Счётчики сходятся.')
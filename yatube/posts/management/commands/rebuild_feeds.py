@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id читателя; можно указать несколько раз.',
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        total = feeds.rebuild(user_ids)
+        self.stdout.write(f'Записей в лентах: {total}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет полнотекстовый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        total = search.rebuild(
+            batch_size,
+            progress=lambda done: self.stdout.write(f'... {done}'),
+        )
+        self.stdout.write(f'Проиндексировано постов: {total}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding
+from posts.models import User, shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Переносит посты и комментарии автора на другой шард.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('target', help='Алиас шарда из POSTS_SHARDS.')
+        parser.add_argument(
+            '--grace', type=float, default=5,
+            help='Через сколько секунд подобрать запоздавшие записи.',
+        )
+
+    def handle(self, *args, username, target, grace, **options):
+        if target not in shard_aliases():
+            raise CommandError(f'{target} нет в POSTS_SHARDS.')
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise CommandError(f'Пользователь {username} не найден.')
+        source = sharding.shard_for(author.pk, assign=True)
+        moved = sharding.move_author(author.pk, target, grace)
+        self.stdout.write(f'{username}: {source} → {target}, строк: {moved}')
@@ -0,0 +1,112 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержки, запросы и память для всех адресов posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument(
+            '--user', help='Выполнять запросы от имени пользователя.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--url', action='append', dest='names',
+            help='Имя адреса из posts.urls; можно указать несколько раз.',
+        )
+        parser.add_argument(
+            '--mixed', type=float, metavar='SECONDS',
+            help='Смешанная нагрузка чтением и записью из нескольких '
+                 'потоков вместо замера отдельных адресов.',
+        )
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--write-share', type=float, default=0.2,
+            help='Доля запросов на запись при --mixed.',
+        )
+        parser.add_argument(
+            '--sessions', action='store_true',
+            help='Сравнить число запросов со стандартными сессиями '
+                 'и с сессиями и пользователем из кеша.',
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого запуска для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95, доля (0.2 = 20%%).',
+        )
+
+    def handle(self, *args, requests, user, cold, names, output, baseline,
+               threshold, mixed, threads, write_share, sessions, **options):
+        if mixed:
+            return self.mixed(mixed, threads, write_share, output)
+        if sessions:
+            return self.sessions(requests, user, output)
+        results = benchmark.run(requests, user, cold, names)
+        if not results:
+            raise CommandError('Нет данных: сначала выполните seed_benchmark.')
+        self.stdout.write(
+            f'{"url":<18} {"code":>4} {"p50":>7} {"p95":>7} {"p99":>7} '
+            f'{"rps":>7} {"sql":>4} {"peak KB":>8}'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<18} {row["status"]:>4} {row["p50"]:>7.1f} '
+                f'{row["p95"]:>7.1f} {row["p99"]:>7.1f} {row["rps"]:>7.0f} '
+                f'{row["queries"]:>4} {row["peak_kb"]:>8.0f}'
+            )
+        if output:
+            with open(output, 'w') as stream:
+                json.dump(results, stream, indent=2)
+        if baseline:
+            with open(baseline) as stream:
+                found = benchmark.regressions(
+                    json.load(stream), results, threshold
+                )
+            for line in found:
+                self.stderr.write(line)
+            if found:
+                raise CommandError(f'Регрессий: {len(found)}')
+
+    def mixed(self, seconds, threads, write_share, output):
+        report = benchmark.mixed(seconds, threads, write_share)
+        if not report:
+            raise CommandError('Нет данных: сначала выполните seed_benchmark.')
+        for kind in ('read', 'write'):
+            row = report[kind]
+            self.stdout.write(
+                f'{kind:<6} {row["count"]:>6} p50 {row["p50"]:>7.1f} '
+                f'p95 {row["p95"]:>7.1f} rps {row["rps"]:>7.0f}'
+            )
+        for error, count in report['errors'].items():
+            self.stderr.write(f'{count:>6} × {error}')
+        if output:
+            with open(output, 'w') as stream:
+                json.dump(report, stream, indent=2)
+
+    def sessions(self, requests, user, output):
+        results = benchmark.sessions(requests, user)
+        if not results:
+            raise CommandError('Нет данных: сначала выполните seed_benchmark.')
+        self.stdout.write(
+            f'{"url":<18} {"code":>4} {"sql db":>6} {"cached":>6} '
+            f'{"p50 db":>7} {"cached":>7}'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<18} {row["status"]:>4} {row["db"]:>6g} '
+                f'{row["cached"]:>6g} {row["db_p50"]:>7.1f} '
+                f'{row["cached_p50"]:>7.1f}'
+            )
+        if output:
+            with open(output, 'w') as stream:
+                json.dump(results, stream, indent=2)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу графом пользователей для замеров run_benchmark.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, users, posts, comments, follows, image_share,
+               seed, **options):
+        total = benchmark.seed(
+            progress=lambda done: self.stdout.write(f'... {done}'),
+            users=users, posts=posts, comments=comments, follows=follows,
+            image_share=image_share, seed=seed,
+        )
+        self.stdout.write(f'Создано строк: {total}')
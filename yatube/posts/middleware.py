@@ -0,0 +1,124 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from core import profiling, routers
+
+from .caching import PAGE_CACHE_TIMEOUT, current_versions, page_cache_key
+
+# Страницы, одинаковые для всех гостей.
+CACHED_VIEWS = {'posts', 'groups', 'profile', 'post_detail', 'comments'}
+# Доля срока жизни, после которой один запрос пересчитывает страницу,
+# а остальные ещё получают прежнюю.
+EARLY_RECOMPUTE = 0.8
+LOCK_TIMEOUT = 10
+WAIT_STEP = 0.05
+WAIT_LIMIT = 2
+
+
+class AnonymousPageCacheMiddleware:
+    """Кеш целых страниц ленты для гостей.
+
+    Стоит перед сессиями, аутентификацией и CSRF: гость без cookie
+    сессии получает готовый ответ. На промахе страницу считает один
+    запрос под блокировкой, остальные ждут его результат; незадолго
+    до истечения срока страница пересчитывается заранее. Запись хранит
+    поколения лент, из которых собрана страница, и перестаёт
+    действовать, как только запись в базу сменит любое из них.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+        key = page_cache_key(request)
+        entry = self.fetch(key)
+        locked = False
+        if entry is not None:
+            response, refresh_at, _ = entry
+            if time.time() < refresh_at:
+                return self.conditional(request, response)
+            locked = self.lock(key)
+            if not locked:
+                return self.conditional(request, response)
+        else:
+            locked = self.lock(key)
+            if not locked:
+                entry = self.wait(key)
+                if entry is not None:
+                    return self.conditional(request, entry[0])
+        try:
+            response = self.get_response(request)
+            self.store(key, response)
+        finally:
+            if locked:
+                cache.delete(f'{key}:lock')
+        return response
+
+    def is_cacheable(self, request):
+        if request.method != 'GET':
+            return False
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return False
+        if profiling.HEADER in request.META:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return (
+            match.namespace == 'posts' and match.url_name in CACHED_VIEWS
+        )
+
+    def lock(self, key):
+        return cache.add(f'{key}:lock', True, LOCK_TIMEOUT)
+
+    def fetch(self, key):
+        """Запись кеша, если ленты страницы с тех пор не менялись."""
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        versions = entry[2]
+        if current_versions(versions) != versions:
+            return None
+        return entry
+
+    def wait(self, key):
+        deadline = time.time() + WAIT_LIMIT
+        while time.time() < deadline:
+            time.sleep(WAIT_STEP)
+            entry = self.fetch(key)
+            if entry is not None:
+                return entry
+        return None
+
+    def store(self, key, response):
+        versions = getattr(response, 'feed_versions', None)
+        if not versions or response.status_code != 200 or response.cookies:
+            return
+        if response.streaming or 'private' in response.get(
+            'Cache-Control', ''
+        ):
+            return
+        timeout = PAGE_CACHE_TIMEOUT
+        if getattr(response, 'replica_lagging', False):
+            # Страница с отстающей реплики: см. routers.cache_timeout().
+            timeout = min(timeout, routers.MAX_LAG)
+        refresh_at = time.time() + timeout * EARLY_RECOMPUTE
+        cache.set(key, (response, refresh_at, versions), timeout)
+
+    def conditional(self, request, response):
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified', '')
+            ),
+            response=response,
+        )
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+DEDUP_SQL = (
+    """
+    DELETE FROM posts_follow WHERE id NOT IN (
+        SELECT MIN(id) FROM posts_follow GROUP BY user_id, author_id
+    )
+    """,
+    """
+    UPDATE posts_userstats SET
+        followers_count = (
+            SELECT COUNT(*) FROM posts_follow f
+            WHERE f.author_id = posts_userstats.user_id
+        ),
+        following_count = (
+            SELECT COUNT(*) FROM posts_follow f
+            WHERE f.user_id = posts_userstats.user_id
+        )
+    """,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUP_SQL, migrations.RunSQL.noop),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['created', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:06
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('digest', models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256 загрузки')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to=posts.storage.content_path, verbose_name='Картинка'),
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO posts_imageblob (name, digest, refs)
+            SELECT image, '', COUNT(*) FROM posts_post
+            WHERE image != '' GROUP BY image
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
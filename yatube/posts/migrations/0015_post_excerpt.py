@@ -0,0 +1,45 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:15
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+# Копия posts.models.make_excerpt на момент миграции.
+EXCERPT_LENGTH = 300
+
+
+def make_excerpt(text):
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for post in Post.objects.only('text').iterator(chunk_size=1000):
+        post.excerpt = make_excerpt(post.text)
+        post.text_length = len(post.text)
+        batch.append(post)
+        if len(batch) == 1000:
+            Post.objects.bulk_update(batch, ['excerpt', 'text_length'])
+            batch = []
+    Post.objects.bulk_update(batch, ['excerpt', 'text_length'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Начало текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_length',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Длина текста'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
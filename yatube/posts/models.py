@@ -1,8 +1,25 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.text import Truncator
+
+from .storage import ContentAddressedStorage, content_path
 
 User = get_user_model()
 
+EXCERPT_LENGTH = 300
+# Колонки, которые карточка поста читает в лентах.
+CARD_FIELDS = (
+    'pub_date', 'updated', 'excerpt', 'text_length', 'image',
+    'comments_count', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+
+
+def make_excerpt(text):
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
 
 class Group(models.Model):
     title = models.CharField('Заголовок', max_length=200)
@@ -13,9 +30,56 @@ class Group(models.Model):
         return self.title
 
 
+def shard_aliases():
+    """Шарды постов и комментариев; пустой список — всё в default."""
+    return list(getattr(settings, 'POSTS_SHARDS', []))
+
+
+class ShardedQuerySet(models.QuerySet):
+    def related(self, *fields):
+        """select_related, а при шардировании — prefetch_related.
+
+        Пользователи и группы лежат только в default, поэтому JOIN
+        к ним на другом шарде ничего бы не нашёл.
+        """
+        if shard_aliases():
+            return self.prefetch_related(*fields)
+        return self.select_related(*fields)
+
+    def shards(self):
+        """По queryset-у на каждый шард; без шардирования — [self]."""
+        return [self.using(alias) for alias in shard_aliases()] or [self]
+
+    def create(self, **kwargs):
+        # QuerySet.create выбирает базу до появления объекта, а шард
+        # зависит от автора: пусть его выберет роутер в save().
+        if self._db is not None or not shard_aliases():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class PostQuerySet(ShardedQuerySet):
+    def cards(self):
+        """Посты для лент: без полного текста, с автором и группой."""
+        if shard_aliases():
+            return self.related('author', 'group').only(*(
+                field for field in CARD_FIELDS if '__' not in field
+            ))
+        return self.select_related('author', 'group').only(*CARD_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField('Текст')
+    excerpt = models.CharField(
+        'Начало текста', max_length=EXCERPT_LENGTH, blank=True, editable=False
+    )
+    text_length = models.PositiveIntegerField(
+        'Длина текста', default=0, editable=False
+    )
     pub_date = models.DateTimeField('Дата', auto_now_add=True)
+    updated = models.DateTimeField('Обновлён', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -30,16 +94,48 @@ class Post(models.Model):
     )
     image = models.ImageField(
         'Картинка',
-        upload_to='posts/',
+        upload_to=content_path,
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField('Комментарии', default=0)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, update_fields=None, **kwargs):
+        if 'text' not in self.get_deferred_fields():
+            self.excerpt = make_excerpt(self.text)
+            self.text_length = len(self.text)
+            if update_fields is not None and 'text' in update_fields:
+                update_fields = {*update_fields, 'excerpt', 'text_length'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из базы нужны сигналам, чтобы увидеть, что изменилось.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -63,6 +159,17 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -71,3 +178,81 @@ class Follow(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField('Дата')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики автора, которые поддерживаются при записи."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Посты', default=0)
+    followers_count = models.PositiveIntegerField('Подписчики', default=0)
+    following_count = models.PositiveIntegerField('Подписки', default=0)
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+
+    name = models.CharField('Файл', max_length=255, unique=True)
+    digest = models.CharField(
+        'SHA-256 загрузки', max_length=64, blank=True, db_index=True
+    )
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class AuthorShard(models.Model):
+    """Шард, за которым закреплены посты автора."""
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    alias = models.CharField('База', max_length=100)
+
+
+class ShardSequence(models.Model):
+    """Последний выданный id модели: id уникальны сразу на всех шардах."""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
@@ -0,0 +1,271 @@
+import base64
+import binascii
+import hashlib
+import heapq
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.timezone import is_naive
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Выше порога число записей берётся из кеша, а не считается заново.
+APPROXIMATE_COUNT_THRESHOLD = getattr(
+    settings, 'POSTS_APPROXIMATE_COUNT_THRESHOLD', 10_000
+)
+COUNT_CACHE_TIMEOUT = getattr(settings, 'POSTS_COUNT_CACHE_TIMEOUT', 60 * 5)
+
+
+def encode_cursor(values, direction):
+    """Упаковывает значения ключа в непрозрачный токен для URL."""
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps([direction, payload], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _is_id(field):
+    return field == 'id' or field.endswith('_id')
+
+
+def decode_cursor(token, fields=('pub_date', 'id')):
+    """Разбирает токен; на испорченный токен возвращает None.
+
+    Значений должно быть столько же, сколько полей ключа: для полей
+    id — целые числа, для остальных — даты с часовым поясом.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, payload = json.loads(raw.decode())
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(payload, list):
+        return None
+    if len(payload) != len(fields):
+        return None
+    values = []
+    for field, value in zip(fields, payload):
+        if _is_id(field):
+            # bool — подкласс int, но в ключе его быть не может.
+            if type(value) is not int:
+                return None
+        else:
+            if not isinstance(value, str):
+                return None
+            try:
+                value = parse_datetime(value)
+            except ValueError:
+                return None
+            if value is None or is_naive(value):
+                return None
+        values.append(value)
+    return direction, values
+
+
+class CursorPage:
+    """Страница ленты, выбранная по ключу (pub_date, id) без OFFSET."""
+
+    is_cursor = True
+
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.cursor = cursor
+
+    @cached_property
+    def _page(self):
+        return self.paginator.fetch(self.cursor)
+
+    @property
+    def object_list(self):
+        return self._page[0]
+
+    def has_next(self):
+        return self._page[1]
+
+    def has_previous(self):
+        return self._page[2]
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        if not self.object_list:
+            # Записи за курсором исчезли: назад ведём на первую страницу.
+            return ''
+        return self.paginator.cursor_for(self.object_list[0], PREVIOUS)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __repr__(self):
+        return '<Cursor page %s>' % (self.cursor or 'first')
+
+
+class CursorPaginator:
+    """Keyset-пагинатор: каждая страница стоит как первая.
+
+    Принимает queryset или последовательность queryset-ов с одинаковым
+    ключом сортировки; во втором случае страницы собираются слиянием.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        if hasattr(object_list, 'filter'):
+            object_list = [object_list]
+        self.querysets = list(object_list)
+        self.per_page = int(per_page)
+        self.descending = ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in ordering]
+
+    def get_page(self, token):
+        return CursorPage(self, token)
+
+    def key(self, obj):
+        return tuple(getattr(obj, field) for field in self.fields)
+
+    def cursor_for(self, obj, direction):
+        return encode_cursor(self.key(obj), direction)
+
+    def _order_by(self, reverse):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        return [prefix + field for field in self.fields]
+
+    def _after(self, values, reverse):
+        """Условие «строго после ключа» в порядке обхода."""
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.fields, values):
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _slice(self, queryset, values, reverse):
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+        return list(
+            queryset.order_by(*self._order_by(reverse))[:self.per_page + 1]
+        )
+
+    def fetch(self, token):
+        cursor = decode_cursor(token, self.fields)
+        direction, values = cursor or (NEXT, None)
+        reverse = direction == PREVIOUS
+        chunks = [
+            self._slice(queryset, values, reverse)
+            for queryset in self.querysets
+        ]
+        if len(chunks) == 1:
+            rows = chunks[0]
+        else:
+            rows = list(heapq.merge(
+                *chunks, key=self.key, reverse=self.descending != reverse
+            ))
+        if reverse and not rows:
+            # Новее курсора ничего нет: это первая страница.
+            return self.fetch(None)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            return rows, True, has_more
+        return rows, has_more, values is not None
+
+
+class ApproximatePaginator(Paginator):
+    """Paginator, который не считает большие выборки на каждый запрос.
+
+    Пока записей меньше порога, COUNT(*) выполняется как обычно. Число
+    выше порога запоминается в кеше на COUNT_CACHE_TIMEOUT: номера
+    последних страниц могут немного отставать, зато страница ленты не
+    стоит полного прохода по таблице.
+    """
+
+    ELLIPSIS = '…'
+    approximate = False
+
+    @cached_property
+    def count(self):
+        key = self._count_key()
+        if key is not None:
+            count = cache.get(key)
+            if count is not None:
+                self.approximate = True
+                return count
+        count = super().count
+        if key is not None and count >= APPROXIMATE_COUNT_THRESHOLD:
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    def _count_key(self):
+        if hasattr(self.object_list, 'cache_key'):
+            return self.object_list.cache_key
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return None
+        try:
+            sql = str(query)
+        except EmptyResultSet:
+            return None
+        return 'posts:count:' + hashlib.md5(sql.encode()).hexdigest()
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS."""
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(
+                self.num_pages - on_ends + 1, self.num_pages + 1
+            )
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+def paginate(request, object_list, per_page, ordering=('-pub_date', '-id')):
+    """Курсорная страница; ?page=N оставлен для старых ссылок."""
+    if isinstance(object_list, list) and len(object_list) == 1:
+        object_list = object_list[0]
+    page_number = request.GET.get('page')
+    if page_number is not None and hasattr(object_list, 'filter'):
+        return ApproximatePaginator(object_list, per_page).get_page(
+            page_number
+        )
+    paginator = CursorPaginator(object_list, per_page, ordering)
+    return paginator.get_page(request.GET.get('cursor'))
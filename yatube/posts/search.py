@@ -0,0 +1,229 @@
+import hashlib
+import heapq
+import re
+
+from django.db import (DEFAULT_DB_ALIAS, connection, connections,
+                       transaction)
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import caching
+from .models import Post, shard_aliases
+
+FTS_TABLE = 'posts_post_fts'
+
+# Таблица-индекс хранит только словарь, тексты берутся из posts_post.
+# SQLite пересоздаёт posts_post при ALTER и теряет триггеры, поэтому
+# схема восстанавливается после каждого migrate (см. signals.py).
+SCHEMA = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+def is_supported(conn=connection):
+    return conn.vendor == 'sqlite'
+
+
+def ensure_schema(conn=connection):
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def to_match(query):
+    """Превращает ввод пользователя в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки, последнее ищется как префикс.
+    """
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return ''
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def matching(queryset, query):
+    """Фильтр queryset-а постов по полнотекстовому индексу."""
+    expression = to_match(query)
+    if not expression:
+        return queryset.none()
+    if not is_supported():
+        return queryset.filter(text__icontains=query)
+    # RawSQL внутри pk__in получает двойные скобки, и SQLite сравнивает
+    # id только с первой строкой подзапроса, поэтому здесь extra().
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[expression],
+    )
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _aliases():
+    return shard_aliases() or [DEFAULT_DB_ALIAS]
+
+
+def generation():
+    """Поколение индекса: меняется с каждой записью поста.
+
+    Индекс обновляется триггерами вместе с posts_post, а каждая запись
+    поста сдвигает поколение общей ленты, поэтому оно и служит меткой.
+    """
+    return caching.feed_version('index')
+
+
+class SearchResults:
+    """Ранжированная выдача для django Paginator: count() и срезы.
+
+    При шардировании у каждого шарда свой индекс: число находок
+    складывается, а страница собирается слиянием выдач шардов по bm25.
+    """
+
+    def __init__(self, query):
+        self.expression = to_match(query)
+
+    @property
+    def cache_key(self):
+        """Ключ числа находок: нормализованный запрос и поколение индекса."""
+        if not self.expression:
+            return None
+        raw = f'{generation()}:{self.expression.lower()}'
+        return 'posts:search-count:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def count(self):
+        if not self.expression:
+            return 0
+        total = 0
+        for alias in _aliases():
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s',
+                    [self.expression],
+                )
+                total += cursor.fetchone()[0]
+        return total
+
+    def _rows(self, alias, limit, offset):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                f'SELECT bm25({FTS_TABLE}), rowid, '
+                f'snippet({FTS_TABLE}, 0, %s, %s, %s, 16) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, '…', self.expression, limit, offset],
+            )
+            return [(*row, alias) for row in cursor.fetchall()]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        aliases = _aliases()
+        if len(aliases) == 1:
+            rows = self._rows(aliases[0], index.stop - start, start)
+        else:
+            # Любая строка страницы входит в первые stop строк своего шарда.
+            rows = list(heapq.merge(*(
+                self._rows(alias, index.stop, 0) for alias in aliases
+            )))[start:index.stop]
+        posts = {}
+        for alias in aliases:
+            posts.update(Post.objects.using(alias).related(
+                'author', 'group'
+            ).in_bulk([pk for _, pk, _, db in rows if db == alias]))
+        results = []
+        for _, pk, snippet, _ in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.snippet = _highlight(snippet)
+                results.append(post)
+        return results
+
+
+def search_posts(query):
+    if not is_supported():
+        return matching(
+            Post.objects.select_related('author', 'group'), query
+        )
+    return SearchResults(query)
+
+
+def rebuild(batch_size=1000, progress=None):
+    """Заполняет индекс заново, читая посты пачками; каждый шард — свой."""
+    if not is_supported():
+        return 0
+    done = 0
+    for alias in _aliases():
+        conn = connections[alias]
+        ensure_schema(conn)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')"
+            )
+        posts = Post.objects.using(alias).order_by('pk').values_list(
+            'pk', 'text'
+        )
+        batch = []
+        for row in posts.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                done += _insert(alias, batch)
+                batch = []
+                if progress:
+                    progress(done)
+        if batch:
+            done += _insert(alias, batch)
+    caching.bump_feed('index')
+    return done
+
+
+def _insert(alias, rows):
+    with transaction.atomic(using=alias), \
+            connections[alias].cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)', rows
+        )
+    return len(rows)
@@ -0,0 +1,273 @@
+import time
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import caching
+from .models import (AuthorShard, Comment, FeedEntry, Post, ShardSequence,
+                     User, shard_aliases)
+
+SHARDED_MODELS = (Post, Comment)
+LOCATION_TIMEOUT = 60 * 60 * 24
+MOVE_BATCH_SIZE = 1000
+
+
+def enabled():
+    return bool(shard_aliases())
+
+
+def _author_key(author_id):
+    return f'posts:shard:author:{author_id}'
+
+
+def _post_key(post_id):
+    return f'posts:shard:post:{post_id}'
+
+
+def shard_for(author_id, assign=False):
+    """Шард автора: из справочника, а для новых авторов — по id.
+
+    С assign=True вычисленный шард записывается в справочник, чтобы
+    добавление шардов не переносило уже написанные посты.
+    """
+    alias = cache.get(_author_key(author_id))
+    if alias is not None:
+        return alias
+    alias = AuthorShard.objects.filter(
+        author_id=author_id
+    ).values_list('alias', flat=True).first()
+    if alias is None:
+        aliases = shard_aliases()
+        alias = aliases[author_id % len(aliases)]
+        if not assign:
+            return alias
+        alias = AuthorShard.objects.get_or_create(
+            author_id=author_id, defaults={'alias': alias}
+        )[0].alias
+    cache.set(_author_key(author_id), alias, LOCATION_TIMEOUT)
+    return alias
+
+
+def post_db(post_id):
+    """Шард поста по его id или None без шардирования.
+
+    id не говорит, на каком шарде пост, поэтому найденный шард
+    запоминается в кеше; на промахе шарды опрашиваются по очереди.
+    """
+    if not enabled():
+        return None
+    alias = cache.get(_post_key(post_id))
+    if alias is not None:
+        return alias
+    for alias in shard_aliases():
+        if Post.objects.using(alias).filter(pk=post_id).exists():
+            cache.set(_post_key(post_id), alias, LOCATION_TIMEOUT)
+            return alias
+    return None
+
+
+def reserve_ids(model, count=1):
+    """Последний из count следующих id модели из общей последовательности.
+
+    Последовательность живёт в default; при первом обращении она
+    начинается с наибольшего id на шардах.
+    """
+    name = model._meta.label_lower
+    table = ShardSequence._meta.db_table
+    with connections['default'].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET value = value + %s WHERE name = %s '
+            f'RETURNING value',
+            [count, name],
+        )
+        row = cursor.fetchone()
+    if row is not None:
+        return row[0]
+    ShardSequence.objects.get_or_create(
+        name=name, defaults={'value': top_id(model)}
+    )
+    return reserve_ids(model, count)
+
+
+def next_id(model):
+    """Следующий id модели из общей последовательности в default."""
+    return reserve_ids(model)
+
+
+def top_id(model):
+    """Наибольший id модели на всех шардах и в последовательности."""
+    top = max(
+        model.objects.using(alias).aggregate(top=Max('pk'))['top'] or 0
+        for alias in shard_aliases() or ['default']
+    )
+    if enabled():
+        value = ShardSequence.objects.filter(
+            name=model._meta.label_lower
+        ).values_list('value', flat=True).first()
+        top = max(top, value or 0)
+    return top
+
+
+def advance_sequence(model, value):
+    """Сдвигает последовательность за id, вставленные в обход неё."""
+    ShardSequence.objects.filter(
+        name=model._meta.label_lower, value__lt=value
+    ).update(value=value)
+
+
+class ShardRouter:
+    """Раскладывает посты по автору, комментарии — вслед за постом.
+
+    Остальные модели и запросы без подсказки остаются другим роутерам.
+    """
+
+    def _instance_db(self, model, instance):
+        if instance is None:
+            return None
+        if isinstance(instance, SHARDED_MODELS) and instance._state.db:
+            return instance._state.db
+        if model is Post and isinstance(instance, User):
+            return shard_for(instance.pk)
+        return None
+
+    def _unsharded_db(self, instance):
+        # Без этого Django искал бы автора поста на шарде самого поста.
+        if isinstance(instance, SHARDED_MODELS):
+            return 'default'
+        return None
+
+    def db_for_read(self, model, instance=None, **hints):
+        if not enabled():
+            return None
+        if model not in SHARDED_MODELS:
+            return self._unsharded_db(instance)
+        return self._instance_db(model, instance)
+
+    def db_for_write(self, model, instance=None, **hints):
+        if not enabled():
+            return None
+        if model not in SHARDED_MODELS:
+            return self._unsharded_db(instance)
+        if isinstance(instance, Post):
+            if instance._state.db and not instance._state.adding:
+                return instance._state.db
+            return shard_for(instance.author_id, assign=True)
+        if isinstance(instance, Comment):
+            if instance._state.db and not instance._state.adding:
+                return instance._state.db
+            if Comment.post.is_cached(instance):
+                return instance.post._state.db
+            return post_db(instance.post_id)
+        return self._instance_db(model, instance)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Автор и группа поста живут в default, сам пост — на шарде.
+        if enabled():
+            return True
+        return None
+
+
+def _delete(alias, model, ids):
+    """DELETE без каскада и сигналов: строки не удаляются, а переезжают."""
+    if not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE id IN ({placeholders})',
+            ids,
+        )
+
+
+def _copy(model, queryset, target):
+    """Копирует строки на target, заменяя прежние копии."""
+    rows = list(queryset.order_by('pk'))
+    for start in range(0, len(rows), MOVE_BATCH_SIZE):
+        batch = rows[start:start + MOVE_BATCH_SIZE]
+        _delete(target, model, [row.pk for row in batch])
+        model.objects.using(target).bulk_create(batch)
+    return [row.pk for row in rows]
+
+
+def _move(author_id, source, target, since=None):
+    """Копирует посты автора и комментарии к ним; since — только новое."""
+    posts = Post.objects.using(source).filter(author_id=author_id)
+    comments = Comment.objects.using(source).filter(
+        post__author_id=author_id
+    )
+    if since is not None:
+        posts = posts.filter(updated__gte=since)
+        comments = comments.exclude(pk__in=list(
+            Comment.objects.using(target).filter(
+                post__author_id=author_id
+            ).values_list('pk', flat=True)
+        ))
+    return _copy(Post, posts, target), _copy(Comment, comments, target)
+
+
+def move_author(author_id, target, grace=5):
+    """Переносит посты и комментарии автора на другой шард без остановки.
+
+    Сначала всё копируется, не мешая записи. Затем под блокировкой
+    записи обоих шардов докопируется изменённое с начала переноса,
+    с цели удаляются посты, удалённые за это время, переключается
+    справочник и строки удаляются с исходного шарда. Запись, которая
+    выбрала старый шард до переключения и ждала блокировку, переносится
+    повторным проходом через grace секунд.
+    """
+    source = shard_for(author_id, assign=True)
+    if source == target:
+        return 0
+    started = timezone.now()
+    posts, comments = _move(author_id, source, target)
+    moved = len(posts) + len(comments)
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        posts, comments = _move(author_id, source, target, since=started)
+        moved += len(posts) + len(comments)
+        alive = list(Post.objects.using(source).filter(
+            author_id=author_id
+        ).values_list('pk', flat=True))
+        _delete(target, Post, list(
+            Post.objects.using(target).filter(author_id=author_id).exclude(
+                pk__in=alive
+            ).values_list('pk', flat=True)
+        ))
+        AuthorShard.objects.filter(author_id=author_id).update(alias=target)
+        cache.set(_author_key(author_id), target, LOCATION_TIMEOUT)
+        _delete(source, Comment, list(Comment.objects.using(source).filter(
+            post_id__in=alive
+        ).values_list('pk', flat=True)))
+        _delete(source, Post, alive)
+        # В режиме шардов материализованные ленты не ведутся.
+        FeedEntry.objects.filter(post_id__in=alive).delete()
+    cache.delete_many([_post_key(pk) for pk in alive])
+    if grace:
+        time.sleep(grace)
+        late_posts = Post.objects.using(source).filter(author_id=author_id)
+        late_comments = Comment.objects.using(source).filter(
+            post_id__in=alive
+        )
+        _delete(source, Comment, _copy(Comment, late_comments, target))
+        _delete(source, Post, _copy(Post, late_posts, target))
+    groups = Post.objects.using(target).filter(
+        author_id=author_id, group__isnull=False
+    ).order_by().values_list('group_id', flat=True).distinct()
+    caching.bump_feed(
+        'index', f'profile:{author_id}',
+        *(f'group:{group_id}' for group_id in groups),
+    )
+    return moved
+
+
+def follow_querysets(author_ids):
+    """Посты подписок: по queryset-у на шард с авторами этого шарда."""
+    by_shard = {}
+    for author_id in author_ids:
+        by_shard.setdefault(shard_for(author_id), []).append(author_id)
+    return [
+        Post.objects.using(alias).cards().filter(author_id__in=ids)
+        for alias, ids in by_shard.items()
+    ]
@@ -0,0 +1,142 @@
+from django.db import connections
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, feeds, images, search, sharding
+from .models import Comment, Follow, Post, User, UserStats
+
+NAME_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, created, raw=False,
+                            update_fields=None, **kwargs):
+    # Имя автора показано в лентах с его постами; вход меняет только
+    # last_login, и ленты не трогаются.
+    if created or raw:
+        return
+    if update_fields is not None and not NAME_FIELDS & set(update_fields):
+        return
+    alias = sharding.shard_for(instance.pk) if sharding.enabled() else None
+    groups = Post.objects.using(alias).filter(
+        author_id=instance.pk, group__isnull=False
+    ).order_by().values_list('group_id', flat=True).distinct()
+    caching.bump_feed(
+        'index', f'profile:{instance.pk}',
+        *(f'group:{group_id}' for group_id in groups),
+    )
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def assign_global_id(sender, instance, raw=False, **kwargs):
+    # На шардах свои автоинкременты, а id должны быть общими.
+    if instance.pk is None and not raw and sharding.enabled():
+        instance.pk = sharding.next_id(sender)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        feeds.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def post_image_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = '' if created else loaded.get('image') or ''
+    current = instance.image.name or ''
+    if current != previous:
+        images.acquire(current)
+        images.release(previous)
+        loaded['image'] = current
+        instance._loaded_values = loaded
+
+
+@receiver(post_delete, sender=Post)
+def post_image_deleted(sender, instance, **kwargs):
+    images.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    caching.bump_feed(
+        *caching.post_scopes(instance, loaded.get('group_id'))
+    )
+
+
+def _comment_post(comment):
+    if Comment.post.is_cached(comment):
+        return comment.post
+    return Post.objects.using(
+        sharding.post_db(comment.post_id)
+    ).filter(pk=comment.post_id).only(
+        'author', 'group'
+    ).first()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    post = _comment_post(instance)
+    if post is not None:
+        caching.bump_feed(*caching.post_scopes(post))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        feeds.backfill(instance.user_id, instance.author_id)
+        # Профили показывают число подписчиков и подписок.
+        caching.bump_feed(
+            f'profile:{instance.author_id}', f'profile:{instance.user_id}'
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    followers = counters.drop_follower(instance.author_id)
+    counters.bump_user(instance.user_id, following_count=-1)
+    feeds.prune(instance.user_id, instance.author_id)
+    if followers == feeds.FANOUT_LIMIT:
+        # Автор опустился до порога: его посты снова читаются из лент.
+        feeds.backfill_followers(instance.author_id)
+    caching.bump_feed(
+        f'profile:{instance.author_id}', f'profile:{instance.user_id}'
+    )
+
+
+@receiver(post_migrate)
+def ensure_search_schema(sender, using, **kwargs):
+    if sender.name == 'posts':
+        search.ensure_schema(connections[using])
@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_path(instance, filename):
+    """posts/ab/abcdef….jpg: имя файла — хеш его содержимого."""
+    return f'posts/{filename[:2]}/{filename}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где одинаковое содержимое лежит под одним именем.
+
+    Файл с таким именем уже содержит те же байты, поэтому повторная
+    запись ничего не делает, а гонка двух записей безопасна.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.chmod(tmp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
@@ -0,0 +1,14 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def elided_page_range(page_obj, on_each_side=3, on_ends=2):
+    """Окно номеров страниц вместо ссылки на каждую из них."""
+    paginator = page_obj.paginator
+    if not hasattr(paginator, 'get_elided_page_range'):
+        return paginator.page_range
+    return list(paginator.get_elided_page_range(
+        page_obj.number, on_each_side=on_each_side, on_ends=on_ends
+    ))
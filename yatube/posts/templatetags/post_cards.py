@@ -0,0 +1,28 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..caching import CARD_CACHE_TIMEOUT, card_cache_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, variant='feed'):
+    """Собирает карточки постов из кеша за один get_many.
+
+    Недостающие карточки рендерятся и кладутся одним set_many.
+    """
+    keys = [(card_cache_key(post, variant), post) for post in posts]
+    cards = cache.get_many([key for key, _ in keys])
+    missing = {
+        key: render_to_string(
+            'includes/post_card.html', {'post': post, 'variant': variant}
+        )
+        for key, post in keys if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return mark_safe('<hr>'.join(cards[key] for key, _ in keys))
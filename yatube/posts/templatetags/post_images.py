@@ -0,0 +1,16 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_image(image, post_id=None):
+    """Картинка поста из заранее построенных миниатюр.
+
+    Пока воркер их не построил, отдаётся исходный файл.
+    """
+    return {
+        'image': image, 'thumbnail': thumbnails.prebuilt(image, post_id),
+    }
@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from .. import benchmark
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        call_command(
+            'seed_benchmark', users=20, posts=50, comments=100, follows=40,
+            stdout=StringIO(),
+        )
+        self.output = os.path.join(TEMP_MEDIA_ROOT, 'run.json')
+
+    def test_seed_builds_skewed_graph(self):
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        top = User.objects.order_by('-stats__posts_count').first()
+        self.assertGreater(top.stats.posts_count, 50 / 20)
+
+    def test_every_url_is_measured(self):
+        call_command(
+            'run_benchmark', requests=2, output=self.output,
+            stdout=StringIO(),
+        )
+        with open(self.output) as stream:
+            results = json.load(stream)
+        self.assertEqual(set(results), set(benchmark.targets()))
+        self.assertEqual(results['posts']['status'], 200)
+
+    def test_regressions_fail_the_run(self):
+        call_command(
+            'run_benchmark', requests=2, url=['posts'], output=self.output,
+            stdout=StringIO(),
+        )
+        with open(self.output) as stream:
+            results = json.load(stream)
+        results['posts']['queries'] -= 1
+        with open(self.output, 'w') as stream:
+            json.dump(results, stream)
+        with self.assertRaises(CommandError):
+            call_command(
+                'run_benchmark', requests=2, url=['posts'],
+                baseline=self.output, threshold=100,
+                stdout=StringIO(), stderr=StringIO(),
+            )
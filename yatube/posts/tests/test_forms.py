@@ -1,13 +1,23 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
 
+from .. import thumbnails
 from ..forms import CommentForm, PostForm
-from ..models import Group, Post, User
+from ..models import Group, ImageBlob, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -114,11 +124,14 @@ class PostFormImage(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        cls.small_gif = small_gif
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
             content_type='image/gif'
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.stored_name = f'posts/{digest[:2]}/{digest}.jpg'
 
     @classmethod
     def tearDownClass(cls):
@@ -141,7 +154,7 @@ class PostFormImage(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Тестовый текст',
-                image='posts/small.gif',
+                image=self.stored_name,
             ).exists()
         )
         self.assertRedirects(
@@ -149,6 +162,148 @@ class PostFormImage(TestCase):
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
 
+    def test_same_image_is_stored_once(self):
+        """Одинаковые загрузки делят файл, пока на него есть ссылки"""
+        for text in ('Первый', 'Второй'):
+            self.author_client.post(reverse('posts:post_create'), {
+                'text': text,
+                'image': SimpleUploadedFile(
+                    'copy.gif', self.small_gif, content_type='image/gif'
+                ),
+            })
+        posts = Post.objects.filter(text__in=('Первый', 'Второй'))
+        self.assertEqual(
+            set(posts.values_list('image', flat=True)), {self.stored_name}
+        )
+        path = os.path.join(TEMP_MEDIA_ROOT, self.stored_name)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get(name=self.stored_name).refs, 2)
+        # В TestCase коммита нет, файл удаляем сразу.
+        with mock.patch.object(
+            transaction, 'on_commit', lambda f, using=None: f()
+        ):
+            posts.first().delete()
+            self.assertTrue(os.path.exists(path))
+            posts.first().delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.filter(name=self.stored_name))
+
+    def test_dedup_hit_keeps_file_until_post_saved(self):
+        """Файл, найденный по хешу, не удаляется, пока форма не сохранена"""
+        upload = {'image': SimpleUploadedFile(
+            'copy.gif', self.small_gif, content_type='image/gif'
+        )}
+        first = PostForm(data={'text': 'Первый'}, files=upload)
+        self.assertTrue(first.is_valid(), first.errors)
+        first.instance.author = self.user
+        first.save()
+        upload['image'].seek(0)
+        second = PostForm(data={'text': 'Второй'}, files=upload)
+        self.assertTrue(second.is_valid(), second.errors)
+        path = os.path.join(TEMP_MEDIA_ROOT, self.stored_name)
+        with mock.patch.object(
+            transaction, 'on_commit', lambda f, using=None: f()
+        ):
+            first.instance.delete()
+        self.assertTrue(os.path.exists(path))
+        second.instance.author = self.user
+        second.save()
+        self.assertEqual(ImageBlob.objects.get(name=self.stored_name).refs, 1)
+
+    def test_image_is_normalized(self):
+        """Большая картинка уменьшается и теряет EXIF"""
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', (4000, 1000), 'red').save(
+            buffer, 'JPEG', exif=exif
+        )
+        form = PostForm(
+            data={'text': 'Фото'},
+            files={'image': SimpleUploadedFile(
+                'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+            )},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data['image'])
+        self.assertEqual(image.size, (1920, 480))
+        self.assertNotIn('exif', image.info)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Фотограф')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif',
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    def test_missing_thumbnails_queued_once(self):
+        """Пост без миниатюр при показе ставит их построение в очередь."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        with mock.patch.object(thumbnails, '_submit') as submit:
+            self.client.get(url)
+            self.client.get(url)
+        submit.assert_called_once_with(self.post.image.name, self.post.pk)
+
+    def test_backfill_command(self):
+        self.assertFalse(thumbnails.is_built(self.post.image.name))
+        call_command('build_thumbnails', stdout=StringIO())
+        self.assertIsNotNone(thumbnails.prebuilt(self.post.image))
+
+    def test_shared_image_refreshes_every_card(self):
+        twin = Post.objects.create(
+            text='Та же картинка', author=self.user,
+            image=self.post.image.name,
+        )
+        posts = Post.objects.filter(pk__in=[self.post.pk, twin.pk])
+        before = dict(posts.values_list('pk', 'updated'))
+        thumbnails.generate(self.post.image.name, self.post.pk)
+        for pk, updated in posts.values_list('pk', 'updated'):
+            with self.subTest(pk=pk):
+                self.assertGreater(updated, before[pk])
+
+    def test_template_reads_only_prebuilt_thumbnails(self):
+        """Шаблон не строит миниатюры сам, а берёт готовые из воркера."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertIsNone(thumbnails.prebuilt(self.post.image))
+        self.assertIn(
+            f'src="{self.post.image.url}"',
+            self.client.get(url).content.decode(),
+        )
+        thumbnails.generate(self.post.image.name, self.post.pk)
+        built = thumbnails.prebuilt(self.post.image)
+        self.assertEqual(
+            len(built['srcset'].split(', ')), len(thumbnails.SRCSET_WIDTHS)
+        )
+        content = self.client.get(url).content.decode()
+        self.assertIn(f'src="{built["url"]}"', content)
+        self.assertIn('srcset=', content)
+
 
 class PostCommentTest(TestCase):
     @classmethod
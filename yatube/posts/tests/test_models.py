@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -76,3 +79,48 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     group._meta.get_field(value).help_text, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counted')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        follow.delete()
+        post.comments.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        stats.refresh_from_db()
+        self.assertEqual(stats.followers_count, 0)
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 0)
+
+    def test_rebuild_counters_command(self):
+        Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        call_command('rebuild_counters', '--check', stdout=StringIO())
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_counters', '--check', stderr=StringIO()
+            )
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2
+        )
@@ -0,0 +1,84 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import paginators
+from ..models import Post, User
+from ..paginators import ApproximatePaginator
+from ..search import SearchResults, matching, to_match
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.first = Post.objects.create(
+            author=cls.user, text='Котики любят <b>рыбу</b> и сон',
+        )
+        cls.second = Post.objects.create(
+            author=cls.user, text='Собаки любят гулять, котики спать',
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return response, list(response.context['page_obj'])
+
+    def test_search_finds_and_highlights(self):
+        """Поиск находит пост и подсвечивает совпадение, экранируя HTML."""
+        response, posts = self.search('рыбу')
+        self.assertEqual(posts, [self.first])
+        content = response.content.decode()
+        self.assertIn('<mark>рыбу</mark>', content)
+        self.assertNotIn('<b>', content)
+
+    def test_search_matches_prefix_of_last_word(self):
+        _, posts = self.search('любят кот')
+        self.assertCountEqual(posts, [self.first, self.second])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.second.pk)
+        post.text = 'Попугаи'
+        post.save()
+        self.assertEqual(self.search('собаки')[1], [])
+        self.assertEqual(self.search('попугаи')[1], [post])
+        post.delete()
+        self.assertEqual(self.search('попугаи')[1], [])
+
+    def test_repeated_search_skips_count(self):
+        cache.clear()
+        with mock.patch.object(paginators, 'APPROXIMATE_COUNT_THRESHOLD', 1):
+            count = ApproximatePaginator(SearchResults('Котики'), 10).count
+            self.assertEqual(count, 2)
+            with self.assertNumQueries(0):
+                paginator = ApproximatePaginator(SearchResults('котики '), 10)
+                self.assertEqual(paginator.count, 2)
+            Post.objects.create(author=self.user, text='Котики снова')
+            paginator = ApproximatePaginator(SearchResults('котики'), 10)
+            self.assertEqual(paginator.count, 3)
+            self.assertFalse(paginator.approximate)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(to_match('"OR (NEAR'), '"OR" "NEAR"*')
+        self.assertEqual(self.search('"(*')[1], [])
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            list(matching(Post.objects.all(), 'котики')),
+            list(Post.objects.all()),
+        )
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'рыбу'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.first]
+        )
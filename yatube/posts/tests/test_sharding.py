@@ -0,0 +1,180 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters, search, sharding, transfer
+from ..models import (AuthorShard, Comment, Follow, Group, Post, User,
+                      UserStats)
+
+
+@override_settings(POSTS_SHARDS=['default', 'shard1'])
+class ShardingTests(TestCase):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.near = User.objects.create_user(username='near')
+        self.far = User.objects.create_user(username='far')
+        AuthorShard.objects.create(author=self.near, alias='default')
+        AuthorShard.objects.create(author=self.far, alias='shard1')
+        self.near_post = Post.objects.create(
+            text='Пост на default', author=self.near, group=self.group
+        )
+        self.far_post = Post.objects.create(
+            text='Пост на shard1', author=self.far, group=self.group
+        )
+        self.client.force_login(self.near)
+
+    def test_posts_are_placed_by_author(self):
+        self.assertEqual(self.near_post._state.db, 'default')
+        self.assertEqual(self.far_post._state.db, 'shard1')
+        self.assertFalse(Post.objects.using('default').filter(
+            author=self.far
+        ).exists())
+        self.assertNotEqual(self.near_post.pk, self.far_post.pk)
+
+    def test_index_and_group_merge_shards(self):
+        for url in (
+            reverse('posts:posts'),
+            reverse('posts:groups', args=[self.group.slug]),
+        ):
+            page = self.client.get(url).context['page_obj']
+            self.assertEqual(
+                [post.pk for post in page],
+                [self.far_post.pk, self.near_post.pk],
+            )
+            self.assertEqual(page[0].author, self.far)
+
+    def test_profile_reads_one_shard(self):
+        self.client.get(reverse('posts:profile', args=['far']))
+        with CaptureQueriesContext(connections['default']) as primary:
+            response = self.client.get(
+                reverse('posts:profile', args=['far']), {'cursor': ''}
+            )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.far_post.pk],
+        )
+        self.assertFalse(any(
+            'posts_post' in query['sql'] for query in primary
+        ))
+
+    def test_comments_live_next_to_post(self):
+        url = reverse('posts:add_comment', args=[self.far_post.pk])
+        self.client.post(url, {'text': 'Комментарий'})
+        comment = Comment.objects.using('shard1').get()
+        self.assertEqual(comment.author, self.near)
+        self.far_post.refresh_from_db()
+        self.assertEqual(self.far_post.comments_count, 1)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.far_post.pk])
+        )
+        self.assertEqual(list(response.context['comments']), [comment])
+
+    def test_follow_feed_merges_shards(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.near)
+        Follow.objects.create(user=reader, author=self.far)
+        self.client.force_login(reader)
+        page = self.client.get(reverse('posts:follow_index')).context[
+            'page_obj'
+        ]
+        self.assertEqual(
+            [post.pk for post in page], [self.far_post.pk, self.near_post.pk]
+        )
+
+    def test_reshard_moves_author(self):
+        Comment.objects.create(
+            post=self.far_post, author=self.near, text='Комментарий'
+        )
+        call_command(
+            'reshard', 'far', 'default', grace=0, stdout=StringIO()
+        )
+        self.assertEqual(sharding.shard_for(self.far.pk), 'default')
+        self.assertFalse(Post.objects.using('shard1').exists())
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        moved = Post.objects.using('default').get(pk=self.far_post.pk)
+        self.assertEqual(moved.comments.count(), 1)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.far_post.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_counters_rebuilt_across_shards(self):
+        Comment.objects.create(
+            post=self.far_post, author=self.near, text='Комментарий'
+        )
+        UserStats.objects.update(posts_count=7)
+        Post.objects.using('shard1').update(comments_count=7)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(
+            dict(UserStats.objects.filter(
+                user__in=[self.near, self.far]
+            ).values_list('user_id', 'posts_count')),
+            {self.near.pk: 1, self.far.pk: 1},
+        )
+        self.far_post.refresh_from_db()
+        self.assertEqual(self.far_post.comments_count, 1)
+        self.assertEqual(list(counters.mismatches()), [])
+        UserStats.objects.filter(user=self.far).delete()
+        self.assertEqual(counters.rebuild_user(self.far.pk).posts_count, 1)
+
+    def test_search_covers_all_shards(self):
+        search.rebuild()
+        page = self.client.get(reverse('posts:search'), {'q': 'Пост'})
+        self.assertEqual(
+            {post.pk for post in page.context['page_obj']},
+            {self.near_post.pk, self.far_post.pk},
+        )
+        self.assertEqual(page.context['page_obj'].paginator.count, 2)
+
+    def test_import_places_posts_by_author_shard(self):
+        created = '2020-01-01T00:00:00+00:00'
+        total = transfer.Importer().load([
+            {'model': 'post', 'id': 1, 'text': 'Импорт', 'image': '',
+             'pub_date': created, 'updated': created,
+             'author_name': 'far', 'group_slug': 'group'},
+            {'model': 'comment', 'post_id': 1, 'text': 'Ок',
+             'author_name': 'near', 'created': created},
+        ])
+        self.assertEqual(total, 2)
+        post = Post.objects.using('shard1').get(text='Импорт')
+        self.assertGreater(post.pk, max(self.near_post.pk, self.far_post.pk))
+        comment = Comment.objects.using('shard1').get(post=post)
+        self.assertGreater(sharding.next_id(Comment), comment.pk)
+        later = Post.objects.create(text='После импорта', author=self.near)
+        self.assertGreater(later.pk, post.pk)
+        self.assertEqual(list(counters.mismatches()), [])
+
+    def test_export_round_trip_covers_all_shards(self):
+        Comment.objects.create(post=self.far_post, author=self.near, text='Ок')
+        stream = StringIO()
+        self.assertEqual(transfer.export(stream), 4)
+        originals = sorted(
+            (post.text, post.author.username, post.group.slug)
+            for alias in ('default', 'shard1')
+            for post in Post.objects.using(alias).all()
+        )
+        for alias in ('default', 'shard1'):
+            Post.objects.using(alias).all().delete()
+        stream.seek(0)
+        transfer.Importer().run(stream)
+        self.assertEqual(sorted(
+            (post.text, post.author.username, post.group.slug)
+            for alias in ('default', 'shard1')
+            for post in Post.objects.using(alias).all()
+        ), originals)
+        post = Post.objects.using('shard1').get()
+        self.assertEqual(post.author, self.far)
+        self.assertEqual(
+            list(Comment.objects.using('shard1').values_list(
+                'post_id', 'author_id', 'text'
+            )),
+            [(post.pk, self.near.pk, 'Ок')],
+        )
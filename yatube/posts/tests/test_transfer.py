@@ -0,0 +1,124 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .. import counters
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='exporter')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='export', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dump.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_export_is_gzipped_jsonl(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        with gzip.open(self.path, 'rt') as stream:
+            models = [line.split('"model": "')[1][:4] for line in stream]
+        self.assertEqual(
+            models, ['grou'] + ['post'] * 3 + ['comm'] * 3 + ['foll']
+        )
+
+    def test_round_trip_into_empty_instance(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        originals = list(Post.objects.order_by('pk').values_list(
+            'text', 'pub_date', 'author__username', 'group__slug'
+        ))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command(
+            'import_posts', self.path, batch_size=2, stdout=StringIO()
+        )
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug'
+            )),
+            originals,
+        )
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(
+            Post.objects.first().excerpt, Post.objects.first().text
+        )
+        reader = User.objects.get(username='reader')
+        self.assertTrue(Follow.objects.filter(user=reader).exists())
+        self.assertEqual(FeedEntry.objects.filter(user=reader).count(), 3)
+        self.assertEqual(list(counters.mismatches()), [])
+
+    def test_import_next_to_existing_posts_shifts_ids(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        call_command('import_posts', self.path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 6)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        for post in Post.objects.all():
+            self.assertEqual(post.comments.count(), 1)
+        self.assertEqual(list(counters.mismatches()), [])
+
+    def test_import_keeps_unrelated_feeds(self):
+        call_command('export_posts', self.path, stderr=StringIO())
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=other)
+        Post.objects.create(text='Чужой пост', author=other)
+        kept = set(FeedEntry.objects.filter(
+            post__author=other
+        ).values_list('pk', flat=True))
+        call_command('import_posts', self.path, stdout=StringIO())
+        self.assertTrue(kept)
+        self.assertEqual(set(FeedEntry.objects.filter(
+            post__author=other
+        ).values_list('pk', flat=True)), kept)
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user=self.reader, post__author=self.author
+            ).count(),
+            6,
+        )
+
+    def test_feeds_filled_once_per_batch(self):
+        for i in range(4):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'fan{i}'),
+                author=self.author,
+            )
+        call_command('export_posts', self.path, stderr=StringIO())
+        with CaptureQueriesContext(connection) as captured:
+            call_command(
+                'import_posts', self.path, batch_size=10, stdout=StringIO()
+            )
+        inserts = [
+            query['sql'] for query in captured
+            if query['sql'].startswith(
+                f'INSERT INTO {FeedEntry._meta.db_table}'
+            )
+        ]
+        # Пачка постов и пачка подписок.
+        self.assertEqual(len(inserts), 2)
+        for follow in Follow.objects.filter(author=self.author):
+            self.assertEqual(
+                FeedEntry.objects.filter(user=follow.user).count(), 6
+            )
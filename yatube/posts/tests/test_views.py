@@ -1,10 +1,40 @@
+import base64
+import json
+from datetime import timedelta
+from unittest import mock
+
 from django import forms
 from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+
+from .. import feeds, follows, middleware, paginators, views
+from ..caching import card_cache_key, page_cache_key
+from ..models import (EXCERPT_LENGTH, Comment, FeedEntry, Follow, Group,
+                      Post, User, UserStats)
+from ..paginators import (NEXT, PREVIOUS, ApproximatePaginator,
+                          encode_cursor)
+
 
-from ..models import Follow, Group, Post, User
+# Курсоры с правильной обёрткой, но негодными значениями ключа.
+TAMPERED_CURSORS = (
+    ['2020-13-45T00:00:00', 1],
+    ['abc', 1],
+    [{'a': 1}, 1],
+    ['2020-01-01T00:00:00', 'zz'],
+    ['2020-01-01T00:00:00', 1],
+    ['2020-01-01T00:00:00+00:00'],
+    ['2020-01-01T00:00:00+00:00', True],
+)
+
+
+def raw_cursor(payload, direction=NEXT):
+    raw = json.dumps([direction, payload]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
 
 class PostsViewsTests(TestCase):
@@ -136,17 +166,18 @@ class CacheTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
     def test_cache(self):
-        test_post = Post.objects.create(
-            text='test',
-            author=self.user
-        )
+        """Фрагмент ленты живёт, пока лента не изменилась."""
+        Post.objects.create(text='test', author=self.user)
         cached_index = self.client.get(reverse('posts:posts')).content
-        test_post.delete()
+        Post.objects.filter(text='test').update(
+            text='updated silently', excerpt='updated silently'
+        )
         self.assertEqual(
             cached_index,
             self.client.get(reverse('posts:posts')).content
@@ -157,6 +188,96 @@ class CacheTest(TestCase):
             self.client.get(reverse('posts:posts')).content
         )
 
+    def test_cache_invalidated_by_writes(self):
+        """Создание и удаление поста сменяют поколение ленты."""
+        urls = (
+            reverse('posts:posts'),
+            reverse('posts:profile', args=[self.user]),
+            reverse('posts:groups', args=[self.group.slug]),
+        )
+        pages = [self.client.get(url).content for url in urls]
+        post = Post.objects.create(
+            text='Новый пост', author=self.user, group=self.group
+        )
+        for url, page in zip(urls, pages):
+            with self.subTest(url=url):
+                content = self.client.get(url).content
+                self.assertNotEqual(page, content)
+                self.assertIn(post.text, content.decode())
+        post.delete()
+        for url, page in zip(urls, pages):
+            with self.subTest(url=url):
+                self.assertNotIn(
+                    post.text, self.client.get(url).content.decode()
+                )
+
+    def test_cache_varies_on_page(self):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user) for i in range(12)
+        )
+        first = self.client.get(reverse('posts:posts'))
+        cursor = first.context['page_obj'].next_cursor
+        second = self.client.get(reverse('posts:posts'), {'cursor': cursor})
+        self.assertNotEqual(first.content, second.content)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card_author')
+        cls.post = Post.objects.create(text='Карточка', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def card_key(self):
+        self.post.refresh_from_db()
+        return card_cache_key(self.post, 'feed')
+
+    def test_card_cached_on_render(self):
+        self.client.get(reverse('posts:posts'))
+        self.assertIn('Карточка', cache.get(self.card_key()))
+
+    def test_card_invalidated_by_edit_and_comment(self):
+        self.client.get(reverse('posts:posts'))
+        key = self.card_key()
+        self.client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Исправленная карточка'},
+        )
+        self.assertNotEqual(key, self.card_key())
+        self.assertIn(
+            'Исправленная карточка',
+            self.client.get(reverse('posts:posts')).content.decode(),
+        )
+        key = self.card_key()
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.assertNotEqual(key, self.card_key())
+        self.assertIn(
+            'Комментариев: 1',
+            self.client.get(reverse('posts:posts')).content.decode(),
+        )
+
+    def test_card_follows_author_name(self):
+        for url in (
+            reverse('posts:posts'),
+            reverse('posts:profile', args=[self.user.username]),
+        ):
+            self.client.get(url)
+        self.user.first_name, self.user.last_name = 'Новое', 'Имя'
+        self.user.save()
+        for url in (
+            reverse('posts:posts'),
+            reverse('posts:profile', args=[self.user.username]),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое Имя')
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -236,3 +357,526 @@ class FollowTests(TestCase):
         )
         objects = response_not_follower.context['page_obj'].object_list
         self.assertNotIn(self.follow_post, objects)
+
+    def test_feed_materialized_and_pruned(self):
+        """Подписка заполняет ленту, отписка её чистит."""
+        self.authorized_not_author.get(
+            reverse('posts:profile_follow', args=[self.user_author])
+        )
+        feed = FeedEntry.objects.filter(user=self.user_not_author)
+        self.assertEqual(feed.count(), 2)
+        Post.objects.create(text='Fresh', author=self.user_author)
+        self.assertEqual(feed.count(), 3)
+        self.authorized_not_author.get(
+            reverse('posts:profile_unfollow', args=[self.user_author])
+        )
+        self.assertFalse(feed.exists())
+
+    def test_feed_filled_when_author_drops_below_limit(self):
+        """Посты «звезды» попадают в ленты, когда подписчиков стало мало."""
+        reader = User.objects.create_user(username='reader')
+        with mock.patch.object(feeds, 'FANOUT_LIMIT', 1):
+            follows.follow(self.user_not_author, self.user_author.username)
+            follows.follow(reader, self.user_author.username)
+            fresh = Post.objects.create(text='Fresh', author=self.user_author)
+            feed = FeedEntry.objects.filter(user=self.user_not_author)
+            self.assertFalse(feed.filter(post=fresh).exists())
+            follows.unfollow(reader, self.user_author.username)
+            self.assertTrue(feed.filter(post=fresh).exists())
+            response = self.authorized_not_author.get(
+                reverse('posts:follow_index')
+            )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(self.user_author.posts.order_by('-pub_date', '-id')),
+        )
+
+    def test_feed_merges_posts_of_popular_authors(self):
+        """Посты авторов сверх лимита подмешиваются при чтении."""
+        with mock.patch.object(feeds, 'FANOUT_LIMIT', 0):
+            self.authorized_not_author.get(
+                reverse('posts:profile_follow', args=[self.user_author])
+            )
+            fresh = Post.objects.create(text='Fresh', author=self.user_author)
+            self.assertFalse(FeedEntry.objects.exists())
+            response = self.authorized_not_author.get(
+                reverse('posts:follow_index')
+            )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(self.user_author.posts.order_by('-pub_date', '-id')),
+        )
+        self.assertEqual(response.context['page_obj'][0], fresh)
+
+    def test_repeated_follow_is_single_query(self):
+        """Повторная подписка и отписка — один запрос без изменений."""
+        follows.follow(self.user_not_author, self.user_author.username)
+        with self.assertNumQueries(1):
+            self.assertIsNone(follows.follow(
+                self.user_not_author, self.user_author.username
+            ))
+        follows.unfollow(self.user_not_author, self.user_author.username)
+        with self.assertNumQueries(1):
+            self.assertIsNone(follows.unfollow(
+                self.user_not_author, self.user_author.username
+            ))
+        with self.assertNumQueries(1):
+            self.assertIsNone(follows.follow(
+                self.user_author, self.user_author.username
+            ))
+
+    def test_ajax_follow_returns_state(self):
+        follow_url = reverse('posts:profile_follow', args=[self.user_author])
+        unfollow_url = reverse(
+            'posts:profile_unfollow', args=[self.user_author]
+        )
+        for url, following, count in (
+            (follow_url, True, 1), (follow_url, True, 1),
+            (unfollow_url, False, 0), (unfollow_url, False, 0),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_not_author.get(
+                    url, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+                )
+                self.assertEqual(response.json(), {
+                    'following': following, 'followers_count': count,
+                })
+        self.assertEqual(Follow.objects.count(), 0)
+
+    def test_ajax_follow_author_without_stats(self):
+        UserStats.objects.filter(user=self.user_author).delete()
+        response = self.authorized_not_author.get(
+            reverse('posts:profile_follow', args=[self.user_author]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json(), {
+            'following': True, 'followers_count': 1,
+        })
+
+    def test_follow_missing_author(self):
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.authorized_not_author.get(
+                    reverse(f'posts:{name}', args=['nobody'])
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Paginated')
+        cls.group = Group.objects.create(
+            title='Paginated group',
+            slug='paginated',
+            description='Desc',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Post {i}', author=cls.author, group=cls.group)
+            for i in range(13)
+        )
+        cls.urls = (
+            reverse('posts:posts'),
+            reverse('posts:groups', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсор ведёт вперёд и назад без пропусков и повторов."""
+        expect = list(Post.objects.order_by('-pub_date', '-id'))
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                self.assertEqual(list(first), expect[:10])
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    url, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(second), expect[10:])
+                self.assertFalse(second.has_next())
+                back = self.client.get(
+                    url, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), expect[:10])
+                self.assertTrue(back.has_next())
+                self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(self.urls[0], {'cursor': 'garbage!'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_tampered_cursor_returns_first_page(self):
+        reader = User.objects.create_user(username='cursor-reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        urls = (*self.urls, reverse('posts:follow_index'))
+        for payload in TAMPERED_CURSORS:
+            for url in urls:
+                with self.subTest(payload=payload, url=url):
+                    response = self.client.get(
+                        url, {'cursor': raw_cursor(payload)}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    page = response.context['page_obj']
+                    self.assertEqual(len(page), 10)
+                    self.assertFalse(page.has_previous())
+
+    def test_stale_previous_cursor_returns_first_page(self):
+        cursor = encode_cursor(
+            [timezone.now() + timedelta(days=3650), 10 ** 9], PREVIOUS
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page_obj']
+                self.assertEqual(len(page), 10)
+                self.assertFalse(page.has_previous())
+                self.assertIsNotNone(page.next_cursor)
+
+    def test_numbered_page_still_supported(self):
+        response = self.client.get(self.urls[0], {'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+
+class FeedPagesTestCase(TestCase):
+    """Общие данные для проверок запросов: пять авторов в одной группе."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(
+            title='Budget', slug='budget', description='Desc'
+        )
+        for i in range(5):
+            author = User.objects.create_user(username=f'budget_{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text=f'Post {i}', author=author, group=cls.group
+            )
+            post.comments.create(author=author, text='Comment')
+        cls.post = post
+        cls.urls = {
+            'posts:posts': reverse('posts:posts'),
+            'posts:groups': reverse('posts:groups', args=[cls.group.slug]),
+            'posts:profile': reverse('posts:profile', args=[author]),
+            'posts:post_detail': reverse('posts:post_detail', args=[post.pk]),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:post_edit': reverse('posts:post_edit', args=[post.pk]),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+
+class QueryBudgetTests(FeedPagesTestCase):
+    """Число запросов не зависит от количества постов на странице."""
+
+    # Сессия и пользователь берутся из кеша и в бюджет не входят.
+    BUDGETS = {
+        'posts:posts': 1,
+        'posts:groups': 3,
+        'posts:profile': 4,
+        'posts:post_detail': 4,
+        'posts:follow_index': 2,
+        'posts:post_edit': 2,
+    }
+
+    def assertQueryBudget(self, url, budget):
+        # Первый запрос после входа кладёт пользователя в кеш.
+        self.client.get(reverse('about:author'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries),
+        )
+
+    def test_views_stay_within_query_budget(self):
+        for name, url in self.urls.items():
+            if name == 'posts:post_edit':
+                self.client.force_login(self.post.author)
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, self.BUDGETS[name])
+
+
+class QueryPlanTests(FeedPagesTestCase):
+    """Ленты читаются по индексу, без сортировки во временном B-дереве."""
+
+    def assertUsesIndexes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        with connection.cursor() as cursor:
+            for query in queries:
+                if 'ORDER BY' not in query['sql']:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+                self.assertNotIn('TEMP B-TREE', plan, query['sql'])
+                self.assertNotRegex(plan, r'SCAN \w+( \||$)', query['sql'])
+
+    def test_views_use_indexes(self):
+        cursor = encode_cursor([self.post.pub_date, self.post.pk], NEXT)
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                self.assertUsesIndexes(url)
+                self.assertUsesIndexes(f'{url}?cursor={cursor}')
+
+
+class ConditionalGetTests(FeedPagesTestCase):
+    """Неизменившаяся страница отдаётся как 304 без рендера."""
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.client).get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_not_modified_until_scope_changes(self):
+        for name in ('posts:posts', 'posts:groups', 'posts:profile'):
+            url = self.urls[name]
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('Cookie', response['Vary'])
+                # Сессия и пользователь из кеша, в базе — id группы или автора.
+                queries = 0 if name == 'posts:posts' else 1
+                with self.assertNumQueries(queries):
+                    self.assertEqual(
+                        self.revalidate(url, response).status_code, 304
+                    )
+                post = Post.objects.create(
+                    text='Свежий', author=self.post.author, group=self.group
+                )
+                self.assertEqual(
+                    self.revalidate(url, response).status_code, 200
+                )
+                post.delete()
+
+    def test_post_detail_changes_with_comments(self):
+        url = self.urls['posts:post_detail']
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.post.comments.create(author=self.reader, text='Ещё')
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_validators_depend_on_user(self):
+        url = self.urls['posts:posts']
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(
+            self.revalidate(url, response, Client()).status_code, 200
+        )
+
+
+class PageCacheTests(FeedPagesTestCase):
+    """Гости получают страницы из кеша, пока их ленты не изменились."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_skips_views(self):
+        for url in list(self.urls.values())[:4]:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_purged_by_writes(self):
+        author = self.post.author
+        index = self.urls['posts:posts']
+        profile = self.urls['posts:profile']
+        self.client.get(index)
+        self.client.get(profile)
+        Post.objects.create(text='Новость', author=author)
+        self.assertContains(self.client.get(index), 'Новость')
+        Follow.objects.create(
+            user=User.objects.create_user(username='fan'), author=author
+        )
+        self.assertContains(
+            self.client.get(profile), '<span id="followers-count">2</span>'
+        )
+
+    def test_logged_in_users_bypass_cache(self):
+        url = self.urls['posts:posts']
+        self.client.get(url)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+
+    def test_stale_entry_recomputed_by_one_request(self):
+        url = self.urls['posts:posts']
+        with mock.patch.object(middleware, 'EARLY_RECOMPUTE', 0):
+            self.client.get(url)
+        lock = page_cache_key(RequestFactory().get(url)) + ':lock'
+        cache.add(lock, True)
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.client.get(url).context)
+        cache.delete(lock)
+        self.assertIsNotNone(self.client.get(url).context)
+
+
+class CommentsPaginationTests(TestCase):
+    """Комментарии к посту отдаются порциями по курсору (created, id)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(text='Вирусный пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_loaded_in_batches(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        page = response.context['comments']
+        self.assertEqual(len(page), views.COMMENTS)
+        self.assertEqual(page[0].text, 'Комментарий 0')
+        fragment = self.client.get(
+            reverse('posts:comments', args=[self.post.pk]),
+            {'cursor': page.next_cursor},
+        )
+        self.assertEqual(
+            [comment.text for comment in fragment.context['comments']],
+            [f'Комментарий {i}' for i in range(20, 25)],
+        )
+        self.assertNotContains(fragment, '<html')
+        self.assertNotContains(fragment, 'data-comments-more')
+
+    def test_corrupted_comment_cursor_returns_first_batch(self):
+        url = reverse('posts:comments', args=[self.post.pk])
+        for payload in TAMPERED_CURSORS:
+            with self.subTest(payload=payload):
+                response = self.client.get(
+                    url, {'cursor': raw_cursor(payload)},
+                    HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.context['comments'][0].text, 'Комментарий 0'
+                )
+
+    def test_comments_of_missing_post(self):
+        response = self.client.get(reverse('posts:comments', args=[10 ** 9]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_ajax_comment_returns_fragment(self):
+        self.client.force_login(self.user)
+        url = reverse('posts:add_comment', args=[self.post.pk])
+        response = self.client.post(
+            url, {'text': 'Новый'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, 'Новый', status_code=201)
+        self.assertNotContains(response, '<html', status_code=201)
+        # По id страница убирает дубль, когда порция дойдёт до него.
+        self.assertContains(
+            response,
+            f'data-comment-id="{self.post.comments.latest("id").pk}"',
+            status_code=201,
+        )
+        response = self.client.post(
+            url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json())
+
+
+class PageRangeTests(TestCase):
+    """Нумерованная пагинация не выводит ссылку на каждую страницу."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='pages')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(200)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_page_range(self):
+        paginator = ApproximatePaginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, 2, '…', 47, 48, 49, 50, 51, 52, 53, '…', 99, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, 4, '…', 99, 100],
+        )
+        self.assertEqual(
+            list(ApproximatePaginator(range(50), 10).get_elided_page_range(3)),
+            [1, 2, 3, 4, 5],
+        )
+
+    def test_paginator_include_is_windowed(self):
+        response = self.client.get(reverse('posts:posts'), {'page': 10})
+        content = response.content.decode()
+        self.assertIn('page=20"', content)
+        self.assertNotIn('page=15"', content)
+        self.assertIn('…', content)
+
+    def test_large_counts_are_cached(self):
+        queryset = Post.objects.all()
+        with mock.patch.object(
+            paginators, 'APPROXIMATE_COUNT_THRESHOLD', 100
+        ):
+            self.assertEqual(ApproximatePaginator(queryset, 10).count, 200)
+            Post.objects.create(text='Ещё', author=self.user)
+            with self.assertNumQueries(0):
+                paginator = ApproximatePaginator(queryset, 10)
+                self.assertEqual(paginator.count, 200)
+            self.assertTrue(paginator.approximate)
+        cache.clear()
+        self.assertEqual(ApproximatePaginator(queryset, 10).count, 201)
+
+
+class ExcerptTests(TestCase):
+    """Ленты читают начало текста, полный текст — только страница поста."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='слово ' * 200, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_excerpt_maintained_on_save(self):
+        self.assertEqual(self.post.text_length, 1200)
+        self.assertEqual(len(self.post.excerpt), EXCERPT_LENGTH)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Коротко'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual((post.excerpt, post.text_length), ('Коротко', 7))
+
+    def test_list_views_skip_full_text(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:posts'))
+        feed_query = next(
+            query['sql'] for query in queries
+            if 'posts_post' in query['sql'] and 'LIMIT' in query['sql']
+        )
+        self.assertNotIn('"posts_post"."text"', feed_query)
+        self.assertContains(response, self.post.excerpt)
+        self.assertContains(
+            self.client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            ),
+            self.post.text.strip(),
+        )
@@ -0,0 +1,152 @@
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post, shard_aliases
+
+# Геометрия карточки из шаблонов и ширины для srcset с тем же кадром.
+CARD_GEOMETRY = '960x339'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+SRCSET_WIDTHS = getattr(
+    settings, 'POSTS_THUMBNAIL_SRCSET_WIDTHS', (480, 960, 1440)
+)
+WORKERS = getattr(settings, 'POSTS_THUMBNAIL_WORKERS', 2)
+# Миниатюры, не найденные при рендере, ставятся в очередь не чаще
+# раза за этот срок: так упавшая задача повторяется, но не на каждый показ.
+RETRY_TIMEOUT = getattr(settings, 'POSTS_THUMBNAIL_RETRY_TIMEOUT', 60 * 10)
+
+_executor = None
+
+
+def card_geometry(width):
+    width_0, height_0 = map(int, CARD_GEOMETRY.split('x'))
+    return f'{width}x{round(width * height_0 / width_0)}'
+
+
+def variants():
+    """Все (геометрия, опции), которые нужны шаблонам."""
+    geometries = [CARD_GEOMETRY]
+    geometries += [
+        card_geometry(width) for width in SRCSET_WIDTHS
+        if card_geometry(width) != CARD_GEOMETRY
+    ]
+    return [(geometry, dict(CARD_OPTIONS)) for geometry in geometries]
+
+
+class PrebuiltBackend(ThumbnailBackend):
+    """Достаёт уже зарегистрированную миниатюру, ничего не создавая."""
+
+    def lookup(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PrebuiltBackend()
+
+
+def is_built(name):
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    return backend.lookup(source, CARD_GEOMETRY, **CARD_OPTIONS) is not None
+
+
+def prebuilt(image, post_id=None):
+    """Миниатюра карточки и srcset, если они уже готовы, иначе None.
+
+    Отсутствующие миниатюры ставятся в очередь: у старых постов их не
+    было, а задача воркера могла упасть.
+    """
+    if not image:
+        return None
+    card = backend.lookup(image, CARD_GEOMETRY, **CARD_OPTIONS)
+    if card is None:
+        if cache.add(f'posts:thumbnail:{image.name}', True, RETRY_TIMEOUT):
+            _submit(image.name, post_id)
+        return None
+    srcset = []
+    for width in SRCSET_WIDTHS:
+        thumbnail = backend.lookup(image, card_geometry(width), **CARD_OPTIONS)
+        if thumbnail is not None:
+            srcset.append(f'{thumbnail.url} {width}w')
+    return {'url': card.url, 'srcset': ', '.join(srcset)}
+
+
+def generate(name, post_id=None):
+    """Строит все миниатюры изображения; выполняется в воркере.
+
+    post_id — пост, ради которого задача поставлена: тогда сбрасываются
+    карточки всех постов с этой картинкой.
+    """
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    for geometry, options in variants():
+        get_thumbnail(source, geometry, **options)
+    if post_id is not None:
+        _touch(name)
+
+
+def _touch(name):
+    """Новый updated сбрасывает карточки и ленты всех постов с картинкой.
+
+    Файл общий для постов с одинаковой загрузкой, поэтому постов может
+    быть несколько и на разных шардах.
+    """
+    now = timezone.now()
+    scopes = set()
+    for alias in shard_aliases() or [None]:
+        posts = Post.objects.using(alias).filter(image=name)
+        for author_id, group_id in posts.order_by().values_list(
+            'author_id', 'group_id'
+        ).distinct():
+            scopes.update(caching.post_scopes(
+                Post(author_id=author_id, group_id=group_id)
+            ))
+        posts.update(updated=now)
+    if scopes:
+        caching.bump_feed(*scopes)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            # Инициализатор не должен тянуть этот модуль: модели
+            # импортируются только после django.setup().
+            initializer=django.setup,
+        )
+        atexit.register(_executor.shutdown, wait=False)
+    return _executor
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в очередь после коммита."""
+    if post.image:
+        _submit(post.image.name, post.pk)
+
+
+def _submit(*args):
+    if not WORKERS:
+        transaction.on_commit(lambda: generate(*args))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(generate, *args))
@@ -0,0 +1,337 @@
+import gzip
+import json
+import sys
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, feeds, images, sharding
+from .models import (Comment, Follow, Group, Post, User, make_excerpt,
+                     shard_aliases)
+
+BATCH_SIZE = 5000
+# Сколько значений помещается в один IN (...) без риска упереться в
+# лимит параметров SQLite.
+LOOKUP_BATCH_SIZE = 500
+# Ленты, в которых показаны загруженные посты: scope и поле поста.
+FEED_SCOPES = (('profile', 'author_id'), ('group', 'group_id'))
+
+# Порядок выгрузки: каждая модель ссылается только на выгруженные раньше.
+# Для каждой модели — поля как есть и поля, id в которых заменяются
+# на username или slug: (имя в выгрузке, модель, поле, столбец id).
+EXPORTS = (
+    ('group', Group, ('id', 'title', 'slug', 'description'), ()),
+    ('post', Post, ('id', 'text', 'pub_date', 'updated', 'image'), (
+        ('author_name', User, 'username', 'author_id'),
+        ('group_slug', Group, 'slug', 'group_id'),
+    )),
+    ('comment', Comment, ('post_id', 'text', 'created'), (
+        ('author_name', User, 'username', 'author_id'),
+    )),
+    ('follow', Follow, (), (
+        ('user_name', User, 'username', 'user_id'),
+        ('author_name', User, 'username', 'author_id'),
+    )),
+)
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Файл, файл .gz или '-' для stdin/stdout."""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+    elif path.endswith('.gz'):
+        with gzip.open(path, mode + 't', encoding='utf-8') as stream:
+            yield stream
+    else:
+        with open(path, mode, encoding='utf-8') as stream:
+            yield stream
+
+
+def _encode(value):
+    # DjangoJSONEncoder обрезает микросекунды, а даты нужны точные.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _chunks(values):
+    values = sorted(set(values) - {None})
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        yield values[start:start + LOOKUP_BATCH_SIZE]
+
+
+def _lookup(model, field, ids):
+    """field по id из default пачками: с шардами join между базами нет."""
+    found = {}
+    for chunk in _chunks(ids):
+        found.update(model.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk__in=chunk
+        ).values_list('pk', field))
+    return found
+
+
+def _lookup_by(model, field, values):
+    """id строк default по значениям уникального поля."""
+    found = {}
+    for chunk in _chunks(values):
+        found.update(model.objects.using(DEFAULT_DB_ALIAS).filter(
+            **{f'{field}__in': chunk}
+        ).values_list(field, 'pk'))
+    return found
+
+
+def _post_shards(post_ids):
+    """Шард каждого поста пачки: по запросу к каждому шарду."""
+    found = {}
+    for chunk in _chunks(post_ids):
+        for alias in shard_aliases():
+            found.update(
+                (pk, alias) for pk in Post.objects.using(alias).filter(
+                    pk__in=chunk
+                ).values_list('pk', flat=True)
+            )
+    return found
+
+
+def _batches(queryset, batch_size):
+    rows = queryset.order_by('pk').iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def export(stream, batch_size=BATCH_SIZE, progress=None):
+    """Пишет строки JSONL, читая таблицы по id пачками.
+
+    Посты и комментарии читаются с каждого шарда, имена авторов и
+    группы подставляются запросом к default на каждую пачку.
+    """
+    total = 0
+    for name, model, fields, refs in EXPORTS:
+        aliases = [DEFAULT_DB_ALIAS]
+        if model in sharding.SHARDED_MODELS:
+            aliases = shard_aliases() or aliases
+        for alias in aliases:
+            queryset = model.objects.using(alias).values(
+                *fields, *(column for _, _, _, column in refs)
+            )
+            for rows in _batches(queryset, batch_size):
+                names = {
+                    column: _lookup(
+                        ref_model, field, (row[column] for row in rows)
+                    )
+                    for _, ref_model, field, column in refs
+                }
+                for row in rows:
+                    for key, _, _, column in refs:
+                        row[key] = names[column].get(row.pop(column))
+                    row['model'] = name
+                    stream.write(json.dumps(row, default=_encode) + '\n')
+                    total += 1
+                    if progress and total % batch_size == 0:
+                        progress(total)
+    return total
+
+
+@contextmanager
+def keep_timestamps():
+    """Отключает auto_now(_add): даты берутся из выгрузки."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Post._meta.get_field('updated'),
+        Comment._meta.get_field('created'),
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """Загружает выгрузку пачками bulk_create, каждая в своей транзакции.
+
+    Посты получают id со сдвигом на текущий максимум по всем шардам,
+    поэтому ссылки комментариев пересчитываются без таблицы соответствия.
+    Пользователи и группы сопоставляются по username и slug запросом на
+    пачку; недостающие создаются. Память не растёт с размером выгрузки:
+    между пачками хранятся только границы загруженных id. Сигналы при
+    bulk_create не срабатывают, поэтому ленты дополняются одним INSERT на
+    пачку, а счётчики и ссылки на картинки пересчитываются в конце.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.post_offset = sharding.top_id(Post)
+        self.top_post_id = self.post_offset
+        self.pending = []
+        self.pending_model = None
+        self.total = 0
+
+    def run(self, stream):
+        return self.load(
+            json.loads(line) for line in stream if line.strip()
+        )
+
+    def load(self, rows):
+        """Загружает строки выгрузки, уже разобранные в словари."""
+        with keep_timestamps():
+            for row in rows:
+                self.add(row)
+            self.flush()
+        if sharding.enabled():
+            sharding.advance_sequence(Post, self.top_post_id)
+        counters.rebuild()
+        images.recount()
+        self.bump_feeds()
+        return self.total
+
+    def add(self, row):
+        model = row.pop('model')
+        if model != self.pending_model or len(self.pending) >= self.batch_size:
+            self.flush()
+            self.pending_model = model
+        self.pending.append(row)
+
+    def flush(self):
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        with ExitStack() as stack:
+            for alias in shard_aliases() or [DEFAULT_DB_ALIAS]:
+                stack.enter_context(transaction.atomic(using=alias))
+            getattr(self, f'load_{self.pending_model}')(rows)
+        self.total += len(rows)
+        if self.progress:
+            self.progress(self.total)
+
+    def user_ids(self, names):
+        """id пользователей пачки по username; отсутствующие создаются."""
+        names = set(names)
+        users = _lookup_by(User, 'username', names)
+        new = names - set(users)
+        if new:
+            created = [User(username=name) for name in new]
+            for user in created:
+                user.set_unusable_password()
+            User.objects.bulk_create(created)
+            users.update(_lookup_by(User, 'username', new))
+        return users
+
+    def load_group(self, rows):
+        Group.objects.bulk_create(
+            (
+                Group(
+                    title=row['title'], slug=row['slug'],
+                    description=row['description'],
+                )
+                for row in rows
+            ),
+            ignore_conflicts=True,
+        )
+
+    def load_post(self, rows):
+        users = self.user_ids(row['author_name'] for row in rows)
+        groups = _lookup_by(Group, 'slug', (
+            row['group_slug'] for row in rows if row['group_slug']
+        ))
+        posts = [
+            Post(
+                pk=row['id'] + self.post_offset,
+                text=row['text'],
+                excerpt=make_excerpt(row['text']),
+                text_length=len(row['text']),
+                pub_date=parse_datetime(row['pub_date']),
+                updated=parse_datetime(row['updated']),
+                image=row['image'],
+                author_id=users[row['author_name']],
+                group_id=groups.get(row['group_slug']),
+            )
+            for row in rows
+        ]
+        ids = [post.pk for post in posts]
+        self.top_post_id = max(self.top_post_id, *ids)
+        if not sharding.enabled():
+            Post.objects.bulk_create(posts)
+            feeds.fan_out_range(min(ids), max(ids))
+            return
+        by_shard = {}
+        for post in posts:
+            alias = sharding.shard_for(post.author_id, assign=True)
+            by_shard.setdefault(alias, []).append(post)
+        for alias, shard_posts in by_shard.items():
+            Post.objects.using(alias).bulk_create(shard_posts)
+
+    def load_comment(self, rows):
+        users = self.user_ids(row['author_name'] for row in rows)
+        comments = [
+            Comment(
+                post_id=row['post_id'] + self.post_offset,
+                author_id=users[row['author_name']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            )
+            for row in rows
+        ]
+        if not sharding.enabled():
+            Comment.objects.bulk_create(comments)
+            return
+        # bulk_create не вызывает pre_save: общие id выдаются здесь.
+        last = sharding.reserve_ids(Comment, len(comments))
+        shards = _post_shards(comment.post_id for comment in comments)
+        by_shard = {}
+        for pk, comment in enumerate(comments, last - len(comments) + 1):
+            comment.pk = pk
+            alias = shards[comment.post_id]
+            by_shard.setdefault(alias, []).append(comment)
+        for alias, shard_comments in by_shard.items():
+            Comment.objects.using(alias).bulk_create(shard_comments)
+
+    def load_follow(self, rows):
+        users = self.user_ids(
+            name for row in rows
+            for name in (row['user_name'], row['author_name'])
+        )
+        # Новые строки получают id больше текущего максимума, а уже
+        # существующие подписки пропускаются и в ленты не попадают.
+        after = Follow.objects.aggregate(top=Max('pk'))['top'] or 0
+        Follow.objects.bulk_create(
+            (
+                Follow(
+                    user_id=users[row['user_name']],
+                    author_id=users[row['author_name']],
+                )
+                for row in rows
+                if row['user_name'] != row['author_name']
+            ),
+            ignore_conflicts=True,
+        )
+        feeds.backfill_follows(after)
+
+    def bump_feeds(self):
+        """Сбрасывает кеш общей ленты, профилей и групп загруженных постов."""
+        caching.bump_feed('index')
+        for alias in shard_aliases() or [DEFAULT_DB_ALIAS]:
+            posts = Post.objects.using(alias).filter(
+                pk__gt=self.post_offset, pk__lte=self.top_post_id
+            ).order_by()
+            for scope, field in FEED_SCOPES:
+                ids = posts.exclude(**{field: None}).values_list(
+                    field, flat=True
+                ).distinct().iterator(chunk_size=LOOKUP_BATCH_SIZE)
+                while True:
+                    chunk = list(islice(ids, LOOKUP_BATCH_SIZE))
+                    if not chunk:
+                        break
+                    caching.bump_feed(*(f'{scope}:{pk}' for pk in chunk))
@@ -1,44 +1,60 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core import routers
+
+from . import conditional, follows, thumbnails
+from .caching import FEED_CACHE_TIMEOUT, feed_cache_key
+from .counters import stats_for
+from .feeds import FEED_ORDERING, feed_querysets
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .paginators import ApproximatePaginator, CursorPaginator, paginate
+from .search import search_posts
+from .sharding import post_db
 
 LONG = 10
+COMMENTS = 20
 
 
+@conditional.conditional(conditional.index)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, LONG)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.cards().shards()
+    page_obj = paginate(request, post_list, LONG)
     context = {
         'page_obj': page_obj,
+        'feed_key': feed_cache_key(request, 'index'),
+        'feed_timeout': routers.cache_timeout(FEED_CACHE_TIMEOUT),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional.conditional(conditional.group_posts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, LONG)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.cards().shards()
+    page_obj = paginate(request, post_list, LONG)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_key': feed_cache_key(request, f'group:{group.pk}'),
+        'feed_timeout': routers.cache_timeout(FEED_CACHE_TIMEOUT),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional.conditional(conditional.profile)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.order_by('-pub_date')
-    author_count = posts.count()
-    paginator = Paginator(posts, LONG)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = stats_for(author)
+    page_obj = paginate(
+        request, author.posts.cards(), LONG
+    )
     following = request.user.is_authenticated and Follow.objects.filter(
         author=author,
         user=request.user,
@@ -46,26 +62,73 @@ def profile(request, username):
     context = {
         'author': author,
         'page_obj': page_obj,
-        'author_count': author_count,
+        'author_count': stats.posts_count,
+        'stats': stats,
         'following': following,
+        'feed_key': feed_cache_key(request, f'profile:{author.pk}'),
+        'feed_timeout': routers.cache_timeout(FEED_CACHE_TIMEOUT),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional.conditional(conditional.post_detail)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.using(post_db(post_id)).related(
+            'author__stats', 'group'
+        ),
+        id=post_id,
+    )
     form = CommentForm()
-    comments = post.comments.all()
     context = {
         'post': post,
         'author': post.author,
+        'author_stats': stats_for(post.author),
         'this_user': request.user,
         'form': form,
-        'comments': comments,
+        'comments': _comments_page(request, post.pk),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def _comments_page(request, post_id):
+    return CursorPaginator(
+        Comment.objects.using(post_db(post_id)).filter(
+            post_id=post_id
+        ).related('author'),
+        COMMENTS,
+        ('created', 'id'),
+    ).get_page(request.GET.get('cursor'))
+
+
+@conditional.conditional(conditional.post_detail)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста."""
+    comments = _comments_page(request, post_id)
+    if not comments and not Post.objects.using(post_db(post_id)).filter(
+        pk=post_id
+    ).exists():
+        raise Http404('Пост не найден.')
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = ApproximatePaginator(search_posts(query), LONG).get_page(
+        request.GET.get('page')
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_prefix': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -73,14 +136,17 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect("posts:profile", request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    post = get_object_or_404(
+        Post.objects.using(post_db(post_id)), id=post_id
+    )
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
         request.POST or None,
@@ -89,6 +155,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -100,47 +168,61 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.using(post_db(post_id)), id=post_id
+    )
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        if request.is_ajax():
+            return render(
+                request, 'includes/comment.html', {'comment': comment},
+                status=201,
+            )
+    elif request.is_ajax():
+        return JsonResponse(form.errors, status=400)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    authors_posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(authors_posts, LONG)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(
+        request, feed_querysets(request.user), LONG, FEED_ORDERING
+    )
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+def _follow_response(request, username, following, changed):
+    """JSON с новым состоянием для кнопки или возврат в профиль."""
+    if request.is_ajax():
+        author = get_object_or_404(
+            User.objects.select_related('stats'), username=username
+        )
+        stats = stats_for(author)
+        return JsonResponse({
+            'following': following and author.pk != request.user.pk,
+            'followers_count': stats.followers_count,
+        })
+    if not changed:
+        # Подписка уже была (или её не было), либо автора нет.
+        get_object_or_404(User.objects.only('pk'), username=username)
+    return redirect('posts:profile', username)
+
+
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user != author and not Follow.objects.filter(
-        author=author,
-        user=request.user
-    ).exists():
-        Follow.objects.create(user=request.user, author=author)
-    return redirect('posts:profile', username)
+    changed = follows.follow(request.user, username) is not None
+    return _follow_response(request, username, True, changed)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(
-        author=author,
-        user=request.user
-    )
-    if following.exists():
-        following.delete()
-    return redirect('posts:profile', username)
+    changed = follows.unfollow(request.user, username) is not None
+    return _follow_response(request, username, False, changed)
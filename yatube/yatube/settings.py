@@ -28,20 +28,24 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.auth.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.InstrumentedTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -60,10 +64,48 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'cache_size': -64 * 1024,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+        },
+    },
+}
+# Локальная реплика: копию основной базы обновляет sync_replica.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+    'TEST': {'MIRROR': 'default'},
 }
+# Алиасы, на которые ReplicaRouter отправляет чтение; пусто — всё
+# идёт на default.
+DATABASE_REPLICAS = []
+# Второй шард постов и комментариев. Пользователи и группы есть только
+# в default, поэтому внешние ключи на шардах не проверяются.
+DATABASES['shard1'] = {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'shard1.sqlite3'),
+    'OPTIONS': {
+        'pragmas': {
+            **DATABASES['default']['OPTIONS']['pragmas'],
+            'foreign_keys': 'OFF',
+        },
+    },
+}
+# Шарды постов по автору, например ['default', 'shard1']; пусто — всё
+# в default. Каждый шард создаётся командой migrate --database.
+POSTS_SHARDS = []
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -111,7 +153,24 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50_000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+# Сессии и пользователь читаются из кеша, сессии пишутся в базу после ответа.
+SESSION_ENGINE = 'core.sessions'
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+
+# Тесты держат кеш и метрики во временном каталоге.
+TEST_RUNNER = 'core.test_runner.TemporaryFilesRunner'
+
+# Метрики всех процессов сервера складываются в этот файл.
+METRICS_DATABASE = os.path.join(BASE_DIR, 'metrics.sqlite3')
+# Токен сборщика метрик: заголовок «Authorization: Bearer <токен>».
+# Без токена /metrics видят только сотрудники сайта.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')